@@ -1,8 +1,21 @@
 # Initialization code for the 'src' package
 
 # Importing the modules to make them available when the package is imported
-from .chatbot import UKFormatter, load_knowledge_base, save_knowledge_base, find_best_match, \
-    get_answer_for_question, get_user_input, add_new_answer, clear_log, chat_bot
+from .chatbot import UKFormatter, init_logging, init_chatbot, get_nlp, load_knowledge_base, save_knowledge_base, \
+    load_knowledge_base_and_index, build_question_index, find_top_matches, find_best_match, get_answer_for_question, \
+    get_user_input, learn_answer, add_new_answer, clear_log_file, clear_log, chat_bot
+from .knowledge_base import KnowledgeBase
+from .chat_engine import ChatEngine, ChatResponse, ChatService
+from .session_store import ChatSession, SessionStore, SharedSessionStore
+
+
+def __getattr__(name):
+    # Imported on first use, so `python -m src.server` does not find src.server imported already
+    if name == 'serve':
+        from .server import serve
+        return serve
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Setting up package-level variables or constants
 VERSION = "1.0.0"
@@ -0,0 +1,92 @@
+import logging
+import math
+import os
+from typing import List, Optional
+
+import numpy as np
+
+# Knowledge bases smaller than this are searched exactly; the ANN index only pays off for large corpora
+ANN_THRESHOLD = int(os.environ.get("CHATBOT_ANN_THRESHOLD", "50000"))
+# Number of buckets scored per query: higher means better recall and slower queries
+ANN_PROBES = int(os.environ.get("CHATBOT_ANN_PROBES", "8"))
+
+# Rows are assigned to centroids in chunks so the temporary score matrix stays small
+_CHUNK_ROWS = 65536
+
+
+def _nearest_centroids(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assignments = np.empty(matrix.shape[0], dtype=np.int64)
+    for start in range(0, matrix.shape[0], _CHUNK_ROWS):
+        chunk = matrix[start:start + _CHUNK_ROWS]
+        assignments[start:start + _CHUNK_ROWS] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def _bucket_sums(matrix: np.ndarray, assignments: np.ndarray, n_lists: int) -> np.ndarray:
+    # Sorting once and reducing contiguous runs is much faster than np.add.at
+    order = np.argsort(assignments, kind='stable')
+    bounds = np.searchsorted(assignments[order], np.arange(n_lists))
+    sums = np.zeros((n_lists, matrix.shape[1]), dtype=np.float32)
+    filled = np.bincount(assignments, minlength=n_lists) > 0
+    if filled.any():
+        sums[filled] = np.add.reduceat(matrix[order], bounds[filled], axis=0)
+    return sums
+
+
+class IVFIndex:
+    """Inverted-file index over L2-normalised rows.
+
+    Rows are bucketed by their nearest spherical k-means centroid, and a query only
+    scores the rows in its `n_probe` closest buckets instead of the whole matrix.
+    All-zero rows (questions without a vector) are left out because they can never match.
+    """
+
+    def __init__(self, centroids: np.ndarray, lists: List[np.ndarray], n_probe: int = ANN_PROBES):
+        self.centroids = centroids
+        self.lists = lists
+        self.n_probe = n_probe
+
+    @classmethod
+    def train(cls, matrix: np.ndarray, n_lists: Optional[int] = None, n_probe: int = ANN_PROBES,
+              iterations: int = 10, seed: int = 0) -> 'IVFIndex':
+        rows = np.flatnonzero(matrix.any(axis=1))
+        n_lists = n_lists or max(1, int(math.sqrt(len(rows))))
+        n_lists = min(n_lists, max(1, len(rows)))
+        rng = np.random.default_rng(seed)
+
+        # Train on a sample; a few hundred points per centroid is plenty for spherical k-means
+        sample_rows = rows if len(rows) <= 256 * n_lists else rng.choice(rows, 256 * n_lists, replace=False)
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)] if len(sample) else \
+            np.zeros((n_lists, matrix.shape[1]), dtype=np.float32)
+
+        for _ in range(iterations):
+            assignments = _nearest_centroids(sample, centroids)
+            sums = _bucket_sums(sample, assignments, n_lists)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Keep the previous centroid for buckets that ended up empty
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids).astype(np.float32)
+
+        assignments = _nearest_centroids(np.asarray(matrix[rows], dtype=np.float32), centroids)
+        order = np.argsort(assignments, kind='stable')
+        bounds = np.searchsorted(assignments[order], np.arange(n_lists + 1))
+        lists = [rows[order[bounds[i]:bounds[i + 1]]] for i in range(n_lists)]
+        logging.info(f"ANN index trained with {n_lists} lists over {len(rows)} questions.")
+        return cls(centroids, lists, n_probe)
+
+    def add(self, row: int, vector: np.ndarray):
+        if not vector.any():
+            return
+        bucket = int(np.argmax(self.centroids @ vector))
+        self.lists[bucket] = np.append(self.lists[bucket], row)
+
+    def candidates(self, vector: np.ndarray, n_probe: Optional[int] = None) -> np.ndarray:
+        """Return the row ids stored in the buckets closest to `vector`."""
+        n_probe = min(n_probe or self.n_probe, len(self.lists))
+        scores = self.centroids @ vector
+        if n_probe < len(self.lists):
+            buckets = np.argpartition(-scores, n_probe - 1)[:n_probe]
+        else:
+            buckets = np.arange(len(self.lists))
+        # Sorted ids keep ties resolving to the first entry and make the row gather cache friendly
+        return np.sort(np.concatenate([self.lists[bucket] for bucket in buckets]))
@@ -0,0 +1,92 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+# Pending entries are written once the oldest has waited this many seconds or this many have queued up
+FLUSH_INTERVAL = float(os.environ.get("CHATBOT_FLUSH_INTERVAL", "2.0"))
+FLUSH_COUNT = int(os.environ.get("CHATBOT_FLUSH_COUNT", "20"))
+
+
+class BackgroundWriter:
+    """Batches items and hands them to `write` from a daemon thread.
+
+    `flush()` writes everything pending from the calling thread and `close()` stops the
+    thread after a final flush. Writes are serialised, so batches reach `write` in the
+    order they were submitted; a batch whose write fails is kept and retried.
+    """
+
+    def __init__(self, write: Callable[[List[Any]], None], interval: float = FLUSH_INTERVAL,
+                 max_pending: int = FLUSH_COUNT):
+        self.write = write
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: List[Any] = []
+        self._oldest: Optional[float] = None
+        # After a failed write nothing is retried before this time, even if the batch is full
+        self._retry_at = 0.0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='knowledge-base-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("BackgroundWriter is closed")
+            self._pending.append(item)
+            if self._oldest is None:
+                # Wake the thread so it starts timing the interval from this item
+                self._oldest = time.monotonic()
+                self._condition.notify()
+            elif len(self._pending) >= self.max_pending:
+                self._condition.notify()
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def flush(self):
+        # Taking the write lock before swapping the batch out keeps batches in submission order
+        with self._write_lock:
+            with self._condition:
+                batch, self._pending, self._oldest = self._pending, [], None
+            if not batch:
+                return
+            try:
+                self.write(batch)
+            except Exception as e:
+                logging.error(f"Error writing {len(batch)} pending knowledge base entries, will retry: {e}")
+                with self._condition:
+                    self._pending[:0] = batch
+                    self._oldest = time.monotonic()
+                    self._retry_at = self._oldest + self.interval
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    deadline = self._deadline()
+                    now = time.monotonic()
+                    if deadline is not None and deadline <= now:
+                        break
+                    self._condition.wait(None if deadline is None else deadline - now)
+                if self._closed:
+                    return
+            self.flush()
+
+    def _deadline(self) -> Optional[float]:
+        if not self._pending:
+            return None
+        if len(self._pending) >= self.max_pending:
+            return self._retry_at
+        return max(self._oldest + self.interval, self._retry_at)
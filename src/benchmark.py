@@ -0,0 +1,273 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+try:
+    from .chatbot import find_best_match, get_embedder, init_logging, stream_knowledge_base
+    from .embedding_cache import model_id
+    from .journal import write_json_atomic
+    from .metrics import LatencyHistogram
+    from .query_batcher import BATCH_MAX_SIZE
+    from .question_index import QuestionIndex
+    from .snapshot import read_snapshot, source_stamp, write_snapshot
+except ImportError:
+    from chatbot import find_best_match, get_embedder, init_logging, stream_knowledge_base
+    from embedding_cache import model_id
+    from journal import write_json_atomic
+    from metrics import LatencyHistogram
+    from query_batcher import BATCH_MAX_SIZE
+    from question_index import QuestionIndex
+    from snapshot import read_snapshot, source_stamp, write_snapshot
+
+# Bumped when the results file changes shape, so comparisons can tell old files apart
+BENCHMARK_FORMAT_VERSION = 1
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+BACKENDS = ("exact", "ann", "batched", "find_best_match")
+# Variations in a row that repeat earlier questions before the templates count as exhausted
+MAX_REPEATED_VARIATIONS = 10000
+
+
+def generate_questions(templates: List[Dict[str, Any]], size: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """Yield `size` distinct entries: the templates themselves, then variations of them.
+
+    A variation swaps two words of a template question for words from other templates and
+    adds two more, so questions stay in the model's vocabulary and are spread across the
+    same topics as the real knowledge base. The same seed always gives the same entries.
+    Raises ValueError if the templates are too few or too short for `size` distinct questions.
+    """
+    rng = random.Random(seed)
+    templates = [template for template in templates if template.get("question")]
+    if not templates:
+        raise ValueError("The template knowledge base has no questions.")
+    vocabulary = sorted({word for template in templates for word in template["question"].rstrip('?').split()})
+
+    seen = set()
+    for template in templates[:size]:
+        seen.add(template["question"])
+        yield {"question": template["question"], "answer": template.get("answer")}
+    misses = 0
+    while len(seen) < size:
+        if misses >= MAX_REPEATED_VARIATIONS:
+            raise ValueError(f"The templates only give {len(seen)} distinct questions, not {size}.")
+        template = rng.choice(templates)
+        words = template["question"].rstrip('?').split()
+        for _ in range(2):
+            words[rng.randrange(len(words))] = rng.choice(vocabulary)
+        words.extend(rng.choice(vocabulary) for _ in range(2))
+        question = ' '.join(words) + '?'
+        if question in seen:
+            misses += 1
+            continue
+        misses = 0
+        seen.add(question)
+        yield {"question": question, "answer": template.get("answer")}
+
+
+def make_queries(questions: List[str], count: int, seed: int = 0) -> List[str]:
+    """Pick `count` questions and drop one word from each, so queries are close to, not equal to, an entry."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        words = rng.choice(questions).split()
+        if len(words) > 1:
+            del words[rng.randrange(len(words))]
+        queries.append(' '.join(words))
+    return queries
+
+
+def _timed(function: Callable[[], Any]) -> Any:
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def _latency_result(histogram: LatencyHistogram, queries: int, elapsed: float) -> Dict[str, Any]:
+    result = histogram.summary()
+    result["queries_per_second"] = round(queries / elapsed, 2) if elapsed > 0 else None
+    return result
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def benchmark_size(templates: List[Dict[str, Any]], size: int, queries: int, backends: List[str],
+                   directory: str, seed: int = 0, batch_size: int = BATCH_MAX_SIZE) -> Dict[str, Any]:
+    """Generate a knowledge base of `size` questions in `directory` and time loading, indexing and matching it."""
+    embedder = get_embedder()
+    file_path = os.path.join(directory, f'knowledge_base_{size}.json')
+    write_json_atomic(file_path, {"questions": list(generate_questions(templates, size, seed))})
+    result: Dict[str, Any] = {"size": size, "file_bytes": os.path.getsize(file_path)}
+
+    knowledge_base, result["load_json_seconds"] = _timed(
+        lambda: stream_knowledge_base(file_path, strict=True))
+    question_index, result["index_build_seconds"] = _timed(
+        lambda: QuestionIndex.build(knowledge_base.row_questions(), embedder))
+    _, result["snapshot_write_seconds"] = _timed(
+        lambda: write_snapshot(file_path, knowledge_base, question_index, model_id(embedder), source_stamp(file_path)))
+    loaded, result["snapshot_load_seconds"] = _timed(lambda: read_snapshot(file_path, model_id(embedder)))
+    if loaded is None:
+        raise RuntimeError(f"The snapshot written for '{file_path}' could not be read back.")
+    ann_index = None
+    if "ann" in backends:
+        # Shares the exact index's matrix, so only the buckets take extra memory
+        ann_index = QuestionIndex(question_index.matrix)
+        _, result["ann_build_seconds"] = _timed(ann_index.build_ann)
+
+    query_texts = make_queries(knowledge_base.questions(), queries, seed + 1)
+    embed_histogram = LatencyHistogram()
+    vectors = []
+    started = time.perf_counter()
+    for query in query_texts:
+        doc, elapsed = _timed(lambda: embedder(query))
+        embed_histogram.record(elapsed)
+        vectors.append(doc.vector / doc.vector_norm if doc.vector_norm else None)
+    result["embed"] = _latency_result(embed_histogram, len(query_texts), time.perf_counter() - started)
+    matched = [vector for vector in vectors if vector is not None]
+
+    result["backends"] = {}
+    exact_rows = [question_index.best_match(vector, 1.0) for vector in matched] if "ann" in backends else []
+    for backend in backends:
+        histogram = LatencyHistogram()
+        started = time.perf_counter()
+        if backend in ("exact", "ann"):
+            index = question_index if backend == "exact" else ann_index
+            rows = []
+            for vector in matched:
+                match, elapsed = _timed(lambda: index.best_match(vector, 1.0))
+                histogram.record(elapsed)
+                rows.append(match)
+        elif backend == "batched":
+            for start in range(0, len(matched), batch_size):
+                batch = np.stack(matched[start:start + batch_size])
+                _, elapsed = _timed(lambda: question_index.best_matches(batch))
+                # Every query in a batch waits for the whole batch
+                for _ in range(len(batch)):
+                    histogram.record(elapsed)
+        else:
+            # The chatbot's own path: exact-text lookup, embedding and scan, without the response cache
+            for query in query_texts:
+                _, elapsed = _timed(lambda: find_best_match(query, knowledge_base, question_index))
+                histogram.record(elapsed)
+        count = len(query_texts) if backend == "find_best_match" else len(matched)
+        result["backends"][backend] = _latency_result(histogram, count, time.perf_counter() - started)
+        if backend == "ann" and exact_rows:
+            # Share of queries whose approximate best match scores as well as the exact one
+            found = sum(similarity >= exact[1] - 1e-6 for (_, similarity), exact in zip(rows, exact_rows))
+            result["backends"][backend]["recall_at_1"] = round(found / len(exact_rows), 4)
+
+    result["peak_rss_mb"] = _peak_rss_mb()
+    for key, value in result.items():
+        if key.endswith("_seconds"):
+            result[key] = round(value, 6)
+    return result
+
+
+def run_benchmark(templates: List[Dict[str, Any]], sizes: Sequence[int], queries: int = 1000,
+                  backends: Sequence[str] = BACKENDS, seed: int = 0, directory: Optional[str] = None
+                  ) -> Dict[str, Any]:
+    """Benchmark every size in turn and return the results with the environment they were measured in."""
+    sizes, backends = list(sizes), list(backends)
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        raise ValueError(f"Unknown backends: {', '.join(sorted(unknown))}.")
+    embedder = get_embedder()
+    results = {
+        "format_version": BENCHMARK_FORMAT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                        "platform": platform.platform(), "cpu_count": os.cpu_count(), "model": model_id(embedder)},
+        "parameters": {"sizes": sizes, "queries": queries, "backends": backends, "seed": seed,
+                       "batch_size": BATCH_MAX_SIZE},
+        "results": [],
+    }
+    work_directory = directory or tempfile.mkdtemp(prefix='learnbot-benchmark-')
+    try:
+        for size in sizes:
+            logging.info(f"Benchmarking a knowledge base of {size} questions.")
+            results["results"].append(benchmark_size(templates, size, queries, backends, work_directory, seed))
+            print(format_result(results["results"][-1]), flush=True)
+    finally:
+        if directory is None:
+            shutil.rmtree(work_directory, ignore_errors=True)
+    return results
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    lines = [f"{result['size']} questions: load {result['load_json_seconds']:.3f}s, "
+             f"index {result['index_build_seconds']:.3f}s, snapshot load {result['snapshot_load_seconds']:.3f}s"
+             + (f", ANN build {result['ann_build_seconds']:.3f}s" if "ann_build_seconds" in result else "")]
+    for name, backend in {"embed": result["embed"], **result["backends"]}.items():
+        lines.append(f"  {name:<16}p50 {backend['p50_ms']:>9.3f} ms  p95 {backend['p95_ms']:>9.3f} ms  "
+                     f"p99 {backend['p99_ms']:>9.3f} ms  {backend['queries_per_second'] or 0:>10.1f} q/s"
+                     + (f"  recall {backend['recall_at_1']:.3f}" if "recall_at_1" in backend else ""))
+    return '\n'.join(lines)
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any]) -> str:
+    """Describe how throughput and p95 latency changed for each size and backend both results share."""
+    previous = {result["size"]: result for result in baseline.get("results", [])}
+    lines = []
+    for result in current["results"]:
+        old = previous.get(result["size"])
+        if old is None:
+            continue
+        for name, backend in result["backends"].items():
+            old_backend = old.get("backends", {}).get(name)
+            if not old_backend or not old_backend.get("queries_per_second") or not old_backend.get("p95_ms"):
+                continue
+            qps_change = backend["queries_per_second"] / old_backend["queries_per_second"] - 1
+            p95_change = backend["p95_ms"] / old_backend["p95_ms"] - 1
+            lines.append(f"{result['size']:>9} {name:<16}q/s {qps_change:>+8.1%}  p95 {p95_change:>+8.1%}")
+    return '\n'.join(lines) or "No sizes and backends in common with the baseline."
+
+
+def main():
+    """Benchmark loading and matching synthetic knowledge bases of growing size, e.g. before and after a change."""
+    parser = argparse.ArgumentParser(description="Benchmark matching throughput against knowledge base size.")
+    parser.add_argument("--templates", default=os.path.join("data", "knowledge_base.json"),
+                        help="knowledge base whose questions the synthetic ones are generated from")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--keep", help="directory to keep the generated knowledge bases in")
+    args = parser.parse_args()
+
+    init_logging()
+    with open(args.templates, 'r') as file:
+        templates = json.load(file).get("questions", [])
+    if args.keep:
+        os.makedirs(args.keep, exist_ok=True)
+    results = run_benchmark(templates, args.sizes, args.queries, args.backends, args.seed, args.keep)
+    write_json_atomic(args.output, results)
+    print(f"Results written to '{args.output}'.")
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            print(compare_results(json.load(file), results))
+
+
+if __name__ == '__main__':
+    main()
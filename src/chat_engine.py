@@ -0,0 +1,330 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import Executor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    from .background_writer import BackgroundWriter
+    from .chatbot import append_to_knowledge_base, clear_log_file, find_best_match, get_embedder, index_new_entry, \
+        init_chatbot, learn_answer, load_knowledge_base_and_index, load_knowledge_base_snapshot, reboot_logger, \
+        start_background_tasks, start_file_watcher, take_reloaded
+    from .file_watcher import FileWatcher
+    from .journal import FOLDED_JOURNAL_KEY, JournalFollower, journal_lock
+    from .knowledge_base import KnowledgeBase
+    from .metrics import METRICS_FILE, metrics
+    from .query_batcher import BATCH_WINDOW, QueryBatcher
+    from .question_index import QuestionIndex
+    from .response_cache import ResponseCache
+    from .session_store import ChatSession
+    from .snapshot import source_stamp
+except ImportError:
+    from background_writer import BackgroundWriter
+    from chatbot import append_to_knowledge_base, clear_log_file, find_best_match, get_embedder, index_new_entry, \
+        init_chatbot, learn_answer, load_knowledge_base_and_index, load_knowledge_base_snapshot, reboot_logger, \
+        start_background_tasks, start_file_watcher, take_reloaded
+    from file_watcher import FileWatcher
+    from journal import FOLDED_JOURNAL_KEY, JournalFollower, journal_lock
+    from knowledge_base import KnowledgeBase
+    from metrics import METRICS_FILE, metrics
+    from query_batcher import BATCH_WINDOW, QueryBatcher
+    from question_index import QuestionIndex
+    from response_cache import ResponseCache
+    from session_store import ChatSession
+    from snapshot import source_stamp
+
+TEACH_PROMPT = "Sorry, I don't know the answer. Can you please educate me?"
+# Commands that act on the whole chatbot rather than one conversation
+OPERATOR_COMMANDS = ('reload', 'reboot', 'stats', 'clear log')
+
+
+class ChatService:
+    """The loaded chatbot behind every front end: one model, knowledge base and index shared by all callers.
+
+    Its methods block, so ChatEngine runs them on an executor. Asking only reads the live state,
+    so questions are matched in parallel, and in batches through a QueryBatcher while
+    `batch_window` is above 0. Teaching, reloading and swapping in a
+    background reload take `_lock` and run one at a time.
+
+    With `shared`, several pre-forked worker processes serve the same files. Each worker then
+    writes taught answers to the journal straight away, under journal_lock, and learns every
+    answer (its own included) by following the journal, so all workers agree on its order.
+    Background threads are only started by `start()`, which a worker calls after the fork.
+    """
+
+    def __init__(self, knowledge_base_file: str = 'knowledge_base.json', shared: bool = False,
+                 batch_window: float = BATCH_WINDOW):
+        init_chatbot()
+        self.knowledge_base_file = knowledge_base_file
+        self.shared = shared
+        self.batch_window = batch_window
+        self.follower = JournalFollower(knowledge_base_file) if shared else None
+        self._stamp = source_stamp(knowledge_base_file)
+        if shared:
+            knowledge_base, question_index = load_knowledge_base_snapshot(knowledge_base_file, shared=True)
+            self.follower.folded = knowledge_base.other_value(FOLDED_JOURNAL_KEY)
+        else:
+            knowledge_base, question_index = load_knowledge_base_and_index(knowledge_base_file)
+        # Replaced as one tuple, so a request never sees an index that belongs to another knowledge base;
+        # the response cache is replaced with them because its entries hold positions into the old one
+        self.state: Tuple[KnowledgeBase, QuestionIndex, ResponseCache] = \
+            (knowledge_base, question_index, ResponseCache())
+        self._lock = threading.Lock()
+        self.watcher: Optional[FileWatcher] = None
+        self.writer: Optional[BackgroundWriter] = None
+        self.batcher: Optional[QueryBatcher] = None
+        if shared:
+            self._follow()
+        else:
+            self.start()
+
+    def start(self):
+        """Start the file watcher, the background writer (unless shared) and the query batcher."""
+        if self.shared:
+            self.watcher = start_file_watcher(self.knowledge_base_file, self._stamp, lambda: self.state[:2],
+                                              shared=True)
+        else:
+            self.watcher, self.writer = start_background_tasks(self.knowledge_base_file, self._stamp,
+                                                               lambda: self.state[:2])
+        self.batcher = QueryBatcher(get_embedder(), self.batch_window) if self.batch_window > 0 else None
+
+    def current(self) -> Tuple[KnowledgeBase, QuestionIndex, ResponseCache]:
+        """Return the live state, first swapping in a knowledge base the watcher rebuilt."""
+        if self.shared:
+            with self._lock:
+                self._take_shared_reload()
+                self._follow()
+        elif self.watcher is not None:
+            with self._lock:
+                reloaded = take_reloaded(self.knowledge_base_file, self.watcher, self.writer, self.state[:2])
+                if reloaded is not None:
+                    self.state = (*reloaded, ResponseCache())
+                    logging.info(f"Knowledge base reloaded after a change to '{self.knowledge_base_file}'.")
+        return self.state
+
+    def _take_shared_reload(self):
+        reloaded = self.watcher.take() if self.watcher is not None else None
+        if reloaded is None:
+            return
+        stamp, (knowledge_base, question_index) = reloaded
+        if stamp != source_stamp(self.knowledge_base_file):
+            # The file changed again since it was read
+            self.watcher.invalidate()
+            return
+        self.state = (knowledge_base, question_index, ResponseCache())
+        # The rebuild only holds the JSON file, so the whole journal is followed again on top of it
+        self.follower.restart(knowledge_base.other_value(FOLDED_JOURNAL_KEY))
+        logging.info(f"Knowledge base reloaded after a change to '{self.knowledge_base_file}'.")
+
+    def _follow(self, lock: bool = True):
+        entries = self.follower.read_new(lock)
+        if entries:
+            self._add_entries(entries)
+            logging.info(f"Replayed {len(entries)} journal entries for '{self.knowledge_base_file}'.")
+
+    def _add_entries(self, entries: List[Dict[str, Any]]):
+        knowledge_base, question_index, response_cache = self.state
+        for entry in entries:
+            fields = {key: value for key, value in entry.items() if key not in ("question", "answer")}
+            position = knowledge_base.add(entry.get("question", ""), entry.get("answer"), fields)
+            index_new_entry(knowledge_base, position, question_index, response_cache)
+
+    def ask(self, question: str) -> Dict[str, Any]:
+        knowledge_base, question_index, response_cache = self.current()
+        metrics.increment("questions_asked")
+        best_match = find_best_match(question, knowledge_base, question_index, response_cache, self.batcher)
+        with metrics.timer("lookup"):
+            answer = knowledge_base.answer(best_match) if best_match is not None else None
+            matched_question = knowledge_base.question(best_match) if answer else None
+
+        if answer:
+            logging.info(f"Responding to question '{matched_question}' with answer '{answer}'.")
+            return {"answer": answer, "matched_question": matched_question, "needs_answer": False}
+        if best_match is not None:
+            logging.warning(f"No answer found for the matched question '{knowledge_base.question(best_match)}'.")
+        else:
+            logging.warning(f"No match found for the user question '{question}'.")
+        metrics.increment("questions_unanswered")
+        return {"answer": None, "matched_question": None, "needs_answer": True}
+
+    def teach(self, question: str, answer: str) -> Dict[str, Any]:
+        self.current()
+        with self._lock:
+            if self.shared:
+                self._teach_shared({"question": question, "answer": answer})
+            else:
+                knowledge_base, question_index, response_cache = self.state
+                learn_answer(knowledge_base, question, answer, question_index, response_cache,
+                             self.knowledge_base_file, self.writer)
+            metrics.increment("answers_taught")
+            return {"learned": True, "questions": len(self.state[0])}
+
+    def _teach_shared(self, entry: Dict[str, Any]):
+        with journal_lock(self.knowledge_base_file):
+            # Other workers' answers come first, so this worker's order matches the journal's
+            self._follow(lock=False)
+            before = source_stamp(self.knowledge_base_file)
+            append_to_knowledge_base(self.knowledge_base_file, [entry])
+            after = source_stamp(self.knowledge_base_file)
+            if after == before:
+                self._follow(lock=False)
+                return
+            # Compacting folded everything, this answer included, into the file: this worker already
+            # holds all of it, so it carries on from the new, empty journal without a rebuild
+            self._add_entries([entry])
+            self.follower.restart()
+            if self.watcher is not None:
+                self.watcher.expect(before, after)
+        logging.info(f"New answer added for question '{entry['question']}'.")
+
+    def reload(self) -> Dict[str, Any]:
+        with self._lock:
+            if self.writer is not None:
+                # Pending answers must reach the journal before it is replayed
+                self.writer.flush()
+            if self.watcher is not None:
+                # Whatever the watcher rebuilt is older than what is loaded here
+                self.watcher.take()
+            if self.shared:
+                knowledge_base, question_index = load_knowledge_base_snapshot(self.knowledge_base_file,
+                                                                              self.state[:2], shared=True)
+                self.state = (knowledge_base, question_index, ResponseCache())
+                self.follower.restart(knowledge_base.other_value(FOLDED_JOURNAL_KEY))
+                self._follow()
+            else:
+                knowledge_base, question_index = load_knowledge_base_and_index(self.knowledge_base_file,
+                                                                               self.state[:2])
+                self.state = (knowledge_base, question_index, ResponseCache())
+        metrics.increment("reloads")
+        return {"reloaded": True, "questions": len(self.state[0])}
+
+    def health(self) -> Dict[str, Any]:
+        knowledge_base, _, response_cache = self.current()
+        return {"status": "ok", "questions": len(knowledge_base), "response_cache": response_cache.stats(),
+                "pid": os.getpid()}
+
+    def stats(self) -> Dict[str, Any]:
+        """Return this process's latency histograms and counters, and save them to the metrics file."""
+        snapshot = metrics.snapshot()
+        snapshot["metrics_file"] = metrics.write(self.metrics_file())
+        return snapshot
+
+    def metrics_file(self) -> str:
+        if not METRICS_FILE or not self.shared:
+            return METRICS_FILE
+        # Every worker has its own metrics, so each writes its own file
+        root, extension = os.path.splitext(METRICS_FILE)
+        return f"{root}.{os.getpid()}{extension}"
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+        if self.watcher is not None:
+            self.watcher.close()
+        if self.writer is not None:
+            # Flushing the pending answers is the last persistence the metrics should include
+            self.writer.close()
+        metrics.write(self.metrics_file())
+
+
+class ChatResponse(NamedTuple):
+    """The bot's reply to one message, for any front end to render."""
+    text: str
+    # 'answer', 'teach_prompt', 'learned', 'skipped', 'command' or 'error'
+    kind: str
+    matched_question: Optional[str] = None
+    # The conversation is over, e.g. after 'quit'
+    end_session: bool = False
+
+
+class ChatEngine:
+    """Turns one message of a conversation into a ChatResponse, without any input or output of its own.
+
+    The commands, the matching and the teach flow live here, so the CLI, the HTTP server or a
+    websocket only move text in and out. Everything that blocks runs on `executor` (the loop's
+    default executor when None), so one event loop can drive many sessions at once.
+
+    The operator commands (reload, reboot, stats and clear log) only work with
+    `allow_commands`; front ends open to anonymous visitors turn it off, and those
+    messages are then asked like any other question.
+    """
+
+    def __init__(self, service: ChatService, executor: Optional[Executor] = None, allow_commands: bool = True):
+        self.service = service
+        self.executor = executor
+        self.allow_commands = allow_commands
+
+    async def _run(self, function: Any, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def process(self, message: str, session: ChatSession) -> ChatResponse:
+        with metrics.timer("turn"):
+            response = await self._process(message, session)
+        metrics.increment(f"replies_{response.kind}")
+        session.remember(message, response.text)
+        return response
+
+    async def _process(self, message: str, session: ChatSession) -> ChatResponse:
+        try:
+            if session.pending_question is not None:
+                return await self._answer_pending(message, session)
+
+            command = message.lower()
+            if command in ('quit', 'exit'):
+                logging.info("Chatbot session ended by Ray.")
+                return ChatResponse("Goodbye!", 'command', end_session=True)
+            if self.allow_commands and command in OPERATOR_COMMANDS:
+                return await self._command(command, session)
+
+            result = await self._run(self.service.ask, message)
+            if result["needs_answer"]:
+                session.pending_question = message
+                return ChatResponse(TEACH_PROMPT, 'teach_prompt')
+            return ChatResponse(result["answer"], 'answer', result["matched_question"])
+        except Exception as e:
+            logging.error(f"Unexpected error: {e}")
+            return ChatResponse("An unexpected error occurred. Please try again.", 'error')
+
+    async def _command(self, command: str, session: ChatSession) -> ChatResponse:
+        if command == 'reload':
+            await self._run(self.service.reload)
+            logging.info("Knowledge base reloaded by Ray.")
+            return ChatResponse("Knowledge base reloaded.", 'command')
+        if command == 'reboot':
+            return await self._reboot(session)
+        if command == 'stats':
+            return await self._stats()
+        if await self._run(clear_log_file):
+            return ChatResponse("Log file cleared successfully.", 'command')
+        return ChatResponse("Error clearing log file.", 'error')
+
+    async def _answer_pending(self, message: str, session: ChatSession) -> ChatResponse:
+        question, session.pending_question = session.pending_question, None
+        if message.lower() == 'skip':
+            return ChatResponse("", 'skipped')
+        await self._run(self.service.teach, question, message)
+        return ChatResponse("Thank you! I learned a new response!", 'learned')
+
+    async def _stats(self) -> ChatResponse:
+        snapshot = await self._run(self.service.stats)
+        text = metrics.format(snapshot)
+        if snapshot["metrics_file"]:
+            text += f"\nMetrics written to '{snapshot['metrics_file']}'."
+        return ChatResponse(text, 'command')
+
+    async def _reboot(self, session: ChatSession) -> ChatResponse:
+        logging.info("Chatbot reboot initiated by Ray.")
+        reboot_logger.info("Reboot process started.")
+        try:
+            reboot_logger.info("Rebooting the chatbot program.")
+            # A soft restart: the spaCy model and token vectors stay loaded, and only the
+            # knowledge base and session state are rebuilt
+            await self._run(self.service.reload)
+            session.pending_question = None
+            session.history.clear()
+            reboot_logger.info("Chatbot reboot completed successfully.")
+            return ChatResponse("Reboot complete.", 'command')
+        except Exception as e:
+            reboot_logger.error(f"Error during reboot: {e}")
+            return ChatResponse("An error occurred during reboot.", 'error')
@@ -1,13 +1,53 @@
+import asyncio
 import json
 import logging
-import sys
-import spacy
-from typing import Optional, List, Dict, Any
+import os
+from typing import Optional, List, Dict, Any, Tuple, Callable
 from datetime import datetime
 from pytz import timezone, UTC
 
-# Load spaCy model
-nlp = spacy.load("en_core_web_md")
+try:
+    from .ann_index import ANN_THRESHOLD
+    from .background_writer import BackgroundWriter
+    from .embedding_cache import load_question_index, model_id
+    from .file_watcher import RELOAD_INTERVAL, FileWatcher
+    from .journal import FOLDED_JOURNAL_KEY, JOURNAL_COMPACT_EVERY, append_journal, clear_journal, compact_journal, \
+        fold_marker, journal_length, read_journal, rebuild_lock, set_fold_marker, write_json_atomic
+    from .json_stream import iter_questions
+    from .knowledge_base import KnowledgeBase
+    from .metrics import metrics
+    from .query_batcher import QueryBatcher
+    from .question_index import QuestionIndex
+    from .response_cache import ResponseCache
+    from .snapshot import SNAPSHOT_ENABLED, read_snapshot, source_stamp, write_snapshot
+    from .token_vectors import TokenVectorCache
+except ImportError:
+    from ann_index import ANN_THRESHOLD
+    from background_writer import BackgroundWriter
+    from embedding_cache import load_question_index, model_id
+    from file_watcher import RELOAD_INTERVAL, FileWatcher
+    from journal import FOLDED_JOURNAL_KEY, JOURNAL_COMPACT_EVERY, append_journal, clear_journal, compact_journal, \
+        fold_marker, journal_length, read_journal, rebuild_lock, set_fold_marker, write_json_atomic
+    from json_stream import iter_questions
+    from knowledge_base import KnowledgeBase
+    from metrics import metrics
+    from query_batcher import QueryBatcher
+    from question_index import QuestionIndex
+    from response_cache import ResponseCache
+    from snapshot import SNAPSHOT_ENABLED, read_snapshot, source_stamp, write_snapshot
+    from token_vectors import TokenVectorCache
+
+# Pipeline components that matching never uses: doc.vector and vector_norm only need
+# the tokenizer and the static vectors table, which are always kept
+VECTORS_ONLY_EXCLUDE = ["tok2vec", "tagger", "morphologizer", "parser", "senter", "attribute_ruler",
+                        "lemmatizer", "ner"]
+
+# The spaCy model is loaded on first use (or by init_chatbot) so importing this module stays cheap
+_nlp = None
+_embedder = None
+_logging_configured = False
+
+reboot_logger = logging.getLogger('reboot_logger')
 
 class UKFormatter(logging.Formatter):
     def converter(self, timestamp):
@@ -22,74 +62,369 @@ class UKFormatter(logging.Formatter):
             s = dt.strftime("%d-%m-%Y %H:%M:%S")
         return s
 
-# Configure general logging to existing log file
-general_formatter = UKFormatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-logging.basicConfig(
-    filename='chatbot.log',
-    level=logging.INFO
-)
+def init_logging():
+    global _logging_configured
+    if _logging_configured:
+        return
+    _logging_configured = True
 
-# Apply the UKFormatter to the root logger's handlers
-for handler in logging.getLogger().handlers:
-    handler.setFormatter(general_formatter)
+    # Configure general logging to existing log file
+    general_formatter = UKFormatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    logging.basicConfig(
+        filename='chatbot.log',
+        level=logging.INFO
+    )
 
-# Configure reboot logging to existing log file
-reboot_logger = logging.getLogger('reboot_logger')
-reboot_handler = logging.FileHandler('chatbot.log')  # Using the same log file as general logging
-reboot_handler.setLevel(logging.INFO)
-reboot_handler.setFormatter(UKFormatter('%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
-reboot_logger.addHandler(reboot_handler)
+    # Apply the UKFormatter to the root logger's handlers
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(general_formatter)
+
+    # Configure reboot logging to existing log file
+    reboot_handler = logging.FileHandler('chatbot.log')  # Using the same log file as general logging
+    reboot_handler.setLevel(logging.INFO)
+    reboot_handler.setFormatter(UKFormatter('%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
+    reboot_logger.addHandler(reboot_handler)
+
+def load_nlp(model_name: str = "en_core_web_md", vectors_only: bool = True):
+    import spacy
+
+    if vectors_only:
+        return spacy.load(model_name, exclude=VECTORS_ONLY_EXCLUDE)
+    return spacy.load(model_name)
+
+def get_nlp():
+    """Return the shared spaCy model, loading it on first use.
+
+    Set CHATBOT_VECTORS_ONLY=0 to load the full pipeline and CHATBOT_SPACY_MODEL to pick another model.
+    """
+    global _nlp
+    if _nlp is None:
+        _nlp = load_nlp(os.environ.get("CHATBOT_SPACY_MODEL", "en_core_web_md"),
+                        vectors_only=os.environ.get("CHATBOT_VECTORS_ONLY", "1") != "0")
+        logging.info("spaCy model loaded successfully.")
+    return _nlp
+
+def get_embedder():
+    """Return what matching embeds text with: the token-vector fast path when the loaded
+    pipeline is vectors-only, otherwise the spaCy pipeline itself."""
+    global _embedder
+    if _embedder is None:
+        nlp = get_nlp()
+        _embedder = TokenVectorCache(nlp) if TokenVectorCache.supports(nlp) else nlp
+    return _embedder
 
-def load_knowledge_base(file_path: str) -> Dict[str, Any]:
+def init_chatbot():
+    """Set up logging and load the spaCy model up front instead of on the first message."""
+    init_logging()
+    get_embedder()
+
+def load_knowledge_base(file_path: str, replay_journal: bool = True, strict: bool = False) -> Dict[str, Any]:
+    """Load the JSON file plus the journal; with `strict`, read errors are raised after being logged."""
+    data: Dict[str, Any] = {}
     try:
-        with open(file_path, 'r') as file:
-            data: Dict[str, Any] = json.load(file)
+        # Entries are decoded one at a time, so the raw JSON text is never held in memory alongside them
+        other_values: Dict[str, Any] = {}
+        questions = list(iter_questions(file_path, other_values))
+        data = {**other_values, "questions": questions}
         logging.info("Knowledge base loaded successfully.")
-        return data
     except FileNotFoundError:
         logging.error(f"Knowledge base file '{file_path}' not found.")
-        return {}
+        if strict:
+            raise
     except json.JSONDecodeError as e:
         logging.error(f"Error decoding JSON in file '{file_path}': {e}")
+        if strict:
+            raise
         return {}
 
+    # Answers taught since the last snapshot are only in the append-only journal
+    journal_entries = read_journal(file_path, data.get(FOLDED_JOURNAL_KEY)) if replay_journal else []
+    if journal_entries:
+        data.setdefault("questions", []).extend(journal_entries)
+        logging.info(f"Replayed {len(journal_entries)} journal entries for '{file_path}'.")
+    return data
+
+def stream_knowledge_base(file_path: str, strict: bool = False) -> KnowledgeBase:
+    """Load the JSON file (not the journal) straight into a KnowledgeBase, one entry at a time.
+
+    Peak memory is the columns plus one decoded entry, instead of the whole list of entry
+    dicts that load_knowledge_base returns. Errors are reported as by load_knowledge_base.
+    """
+    try:
+        other_values: Dict[str, Any] = {}
+        knowledge_base = KnowledgeBase.from_entries(iter_questions(file_path, other_values), other_values)
+        logging.info("Knowledge base loaded successfully.")
+        return knowledge_base
+    except FileNotFoundError:
+        logging.error(f"Knowledge base file '{file_path}' not found.")
+        if strict:
+            raise
+    except json.JSONDecodeError as e:
+        logging.error(f"Error decoding JSON in file '{file_path}': {e}")
+        if strict:
+            raise
+    return KnowledgeBase()
+
 def save_knowledge_base(file_path: str, data: Dict[str, Any]):
+    """Write a full snapshot atomically; the journal is folded into it and cleared.
+
+    `data` must already hold the journal's entries, e.g. as returned by load_knowledge_base;
+    the snapshot records them as folded, so they are not replayed if the journal outlives a crash.
+    """
     try:
-        with open(file_path, 'w') as file:
-            json.dump(data, file, indent=2)
+        data = dict(data)
+        set_fold_marker(data, fold_marker(file_path))
+        write_json_atomic(file_path, data)
+        clear_journal(file_path)
         logging.info("Knowledge base saved successfully.")
     except Exception as e:
         logging.error(f"Error saving knowledge base to '{file_path}': {e}")
 
-def find_best_match(user_input: str, questions: List[str]) -> Optional[str]:
-    best_match = None
-    max_similarity = 0.0
-    user_doc = nlp(user_input)
-    
+def append_to_knowledge_base(file_path: str, entries: List[Dict[str, Any]]):
+    """Persist new entries with an O(1) journal append, compacting into a snapshot periodically.
+
+    Only touches the files, so the background writer can call it while the chat loop keeps
+    teaching. A failed append raises; a failed compaction is logged and retried on a later append.
+    """
+    with metrics.timer("persist"):
+        append_journal(file_path, entries)
+    metrics.increment("persisted_entries", len(entries))
+    if journal_length(file_path) >= JOURNAL_COMPACT_EVERY:
+        try:
+            with metrics.timer("compact"):
+                compact_journal(file_path)
+        except Exception as e:
+            logging.error(f"Error compacting the journal for '{file_path}': {e}")
+
+def build_question_index(knowledge_base: KnowledgeBase, knowledge_base_file: Optional[str] = None,
+                         previous: Optional[Tuple[KnowledgeBase, QuestionIndex]] = None) -> QuestionIndex:
+    """Embed the knowledge base questions, reusing the file's on-disk embedding cache when given.
+
+    With `previous`, the knowledge base and index being replaced, questions it already holds
+    keep their vectors, so a reload only embeds added or edited questions.
+    """
+    if knowledge_base_file is None:
+        question_index = QuestionIndex.build(knowledge_base.row_questions(), get_embedder())
+    else:
+        question_index = load_question_index(knowledge_base_file, knowledge_base.row_questions(), get_embedder(),
+                                             known_vector=known_vector_lookup(previous))
+    if len(question_index) >= ANN_THRESHOLD:
+        # Large knowledge bases trade a little recall for sub-linear queries
+        question_index.build_ann()
+    logging.info(f"Question index built for {len(question_index)} questions.")
+    return question_index
+
+def known_vector_lookup(previous: Optional[Tuple[KnowledgeBase, QuestionIndex]]) -> Optional[Callable[[str], Any]]:
+    """Return a function giving the vector `previous` already holds for a question, or None."""
+    if previous is None:
+        return None
+    knowledge_base, question_index = previous
+    # Taken once: rows the chat loop adds while a reload runs elsewhere are simply not reused
+    matrix = question_index.matrix
+
+    def known_vector(question: str) -> Any:
+        position = knowledge_base.find(question)
+        if position is None or knowledge_base.row(position) >= matrix.shape[0]:
+            return None
+        return matrix[knowledge_base.row(position)]
+
+    return known_vector
+
+def load_knowledge_base_snapshot(file_path: str, previous: Optional[Tuple[KnowledgeBase, QuestionIndex]] = None,
+                                 strict: bool = False, shared: bool = False) -> Tuple[KnowledgeBase, QuestionIndex]:
+    """Load the JSON file's entries and their index, from the compiled snapshot when it is current.
+
+    Does not touch `previous` or the journal, so it can run on a background thread. With
+    `shared`, for processes serving the same file, the work is done under rebuild_lock: the
+    first process to see a change rebuilds and writes the snapshot, the others then find it
+    current, and every one of them maps it, so they keep sharing its pages instead of each
+    holding a private copy of the index.
+    """
+    if not shared or not SNAPSHOT_ENABLED:
+        return _load_knowledge_base_snapshot(file_path, previous, strict)[:2]
+    with rebuild_lock(file_path):
+        knowledge_base, question_index, mapped = _load_knowledge_base_snapshot(file_path, previous, strict)
+        if not mapped:
+            loaded = read_snapshot(file_path, model_id(get_embedder()))
+            if loaded is not None:
+                knowledge_base, question_index = loaded
+    return knowledge_base, question_index
+
+def _load_knowledge_base_snapshot(file_path: str, previous: Optional[Tuple[KnowledgeBase, QuestionIndex]],
+                                  strict: bool) -> Tuple[KnowledgeBase, QuestionIndex, bool]:
+    """Return the knowledge base, its index and whether they were mapped from the snapshot."""
+    embedder = get_embedder()
+    loaded = read_snapshot(file_path, model_id(embedder)) if SNAPSHOT_ENABLED else None
+    if loaded is not None:
+        knowledge_base, question_index = loaded
+        if question_index.ann is None and len(question_index) >= ANN_THRESHOLD:
+            question_index.build_ann()
+        return knowledge_base, question_index, True
+
+    stamp = source_stamp(file_path)
+    knowledge_base = stream_knowledge_base(file_path, strict)
+    question_index = build_question_index(knowledge_base, file_path, previous)
+    # An empty result may stand for a file that failed to parse, which must keep being reported
+    if SNAPSHOT_ENABLED and stamp is not None and len(knowledge_base):
+        write_snapshot(file_path, knowledge_base, question_index, model_id(embedder), stamp)
+    return knowledge_base, question_index, False
+
+def apply_journal(file_path: str, knowledge_base: KnowledgeBase, question_index: QuestionIndex,
+                  previous: Optional[Tuple[KnowledgeBase, QuestionIndex]] = None) -> int:
+    """Add the answers taught since the JSON file was last written, returning how many there were."""
+    journal_entries = read_journal(file_path, knowledge_base.other_value(FOLDED_JOURNAL_KEY))
+    if journal_entries:
+        known_vector = known_vector_lookup(previous)
+        first_new_row = knowledge_base.row_count()
+        knowledge_base.extend(journal_entries)
+        for row in range(first_new_row, knowledge_base.row_count()):
+            question = knowledge_base.question(knowledge_base.row_position(row))
+            vector = known_vector(question) if known_vector is not None else None
+            if vector is None:
+                question_index.add(question, get_embedder())
+            else:
+                question_index.add_vector(vector)
+        logging.info(f"Replayed {len(journal_entries)} journal entries for '{file_path}'.")
+    return len(journal_entries)
+
+def load_knowledge_base_and_index(file_path: str, previous: Optional[Tuple[KnowledgeBase, QuestionIndex]] = None
+                                  ) -> Tuple[KnowledgeBase, QuestionIndex]:
+    """Load the knowledge base and its question index, from the compiled snapshot when it is current.
+
+    The snapshot only covers the JSON file; answers taught since it was last written are
+    replayed from the journal on top of it.
+    """
+    knowledge_base, question_index = load_knowledge_base_snapshot(file_path, previous)
+    apply_journal(file_path, knowledge_base, question_index, previous)
+    return knowledge_base, question_index
+
+def start_file_watcher(knowledge_base_file: str, stamp: Optional[Dict[str, int]],
+                       current: Callable[[], Tuple[KnowledgeBase, QuestionIndex]],
+                       shared: bool = False) -> Optional[FileWatcher]:
+    """Start watching the knowledge base file, unless CHATBOT_RELOAD_INTERVAL is 0.
+
+    `current` returns the live knowledge base and index, which a rebuild reuses vectors from;
+    `shared` is passed on to load_knowledge_base_snapshot.
+    """
+    # Edits to the file are picked up without a 'reload': the watcher rebuilds off the serving
+    # thread and the owner swaps the result in between two messages
+    if RELOAD_INTERVAL <= 0:
+        return None
+    return FileWatcher(knowledge_base_file,
+                       lambda: load_knowledge_base_snapshot(knowledge_base_file, current(), strict=True,
+                                                            shared=shared),
+                       stamp=stamp)
+
+def start_background_tasks(knowledge_base_file: str, stamp: Optional[Dict[str, int]],
+                           current: Callable[[], Tuple[KnowledgeBase, QuestionIndex]]
+                           ) -> Tuple[Optional[FileWatcher], BackgroundWriter]:
+    """Start the file watcher and the background writer; the caller closes them in that order."""
+    watcher = start_file_watcher(knowledge_base_file, stamp, current)
+
+    def persist(entries: List[Dict[str, Any]]):
+        before = source_stamp(knowledge_base_file)
+        append_to_knowledge_base(knowledge_base_file, entries)
+        after = source_stamp(knowledge_base_file)
+        if watcher is not None and after != before:
+            # Compacting the journal rewrote the file with entries that are already loaded
+            watcher.expect(before, after)
+
+    # Taught answers are persisted off the request path; closing flushes whatever is still pending
+    return watcher, BackgroundWriter(persist)
+
+def take_reloaded(file_path: str, watcher: FileWatcher, writer: BackgroundWriter,
+                  live: Tuple[KnowledgeBase, QuestionIndex]) -> Optional[Tuple[KnowledgeBase, QuestionIndex]]:
+    """Return the knowledge base and index the watcher rebuilt in the background, ready to swap in."""
+    reloaded = watcher.take()
+    if reloaded is None:
+        return None
+    stamp, (knowledge_base, question_index) = reloaded
+    # Pending answers must reach the journal before it is replayed
+    writer.flush()
+    if stamp != source_stamp(file_path):
+        # The file changed again since it was read, possibly by compacting the journal just now
+        watcher.invalidate()
+        return None
+    apply_journal(file_path, knowledge_base, question_index, live)
+    return knowledge_base, question_index
+
+def find_top_matches(user_input: str, knowledge_base: KnowledgeBase, question_index: QuestionIndex,
+                     k: int = 5) -> List[Tuple[int, float]]:
+    """Return up to k (entry position, similarity) pairs, best first, without applying the threshold."""
+    user_doc = get_embedder()(user_input)
+
     if not user_doc.vector_norm:  # Check if the user input vector is not empty
         logging.warning(f"User input '{user_input}' resulted in an empty vector.")
-        return None
+        return []
+
+    matches = [(knowledge_base.row_position(row), similarity)
+               for row, similarity in question_index.top_k(user_doc.vector, user_doc.vector_norm, k)]
+    # Identical text always scores 1.0, the same as Doc.similarity, and comes first as in find_best_match
+    position = knowledge_base.find(user_input)
+    if position is not None:
+        matches = [(match, 1.0 if match == position else similarity) for match, similarity in matches]
+        matches.sort(key=lambda match: (match[0] != position, -match[1]))
+    return matches
 
-    for question in questions:
-        question_doc = nlp(question)
-        
-        if not question_doc.vector_norm:  # Check if the question vector is not empty
-            logging.warning(f"Question '{question}' resulted in an empty vector.")
-            continue
-        
-        similarity = user_doc.similarity(question_doc)
-        if similarity > max_similarity:
-            max_similarity = similarity
-            best_match = question
-    
-    logging.info(f"Best match for user input '{user_input}' is '{best_match}' with similarity {max_similarity}.")
+def find_best_match(user_input: str, knowledge_base: KnowledgeBase, question_index: QuestionIndex,
+                    response_cache: Optional[ResponseCache] = None, batcher: Optional[QueryBatcher] = None
+                    ) -> Optional[int]:
+    """Return the position of the best matching knowledge base entry, or None below the threshold.
+
+    With a `batcher`, the input is embedded and scored together with other threads' queries.
+    The time spent is recorded in the "match" histogram, and the embedding and the scan in
+    "embed" and "similarity" (per batch when batched).
+    """
+    with metrics.timer("match"):
+        return _find_best_match(user_input, knowledge_base, question_index, response_cache, batcher)
+
+def _find_best_match(user_input: str, knowledge_base: KnowledgeBase, question_index: QuestionIndex,
+                     response_cache: Optional[ResponseCache], batcher: Optional[QueryBatcher]) -> Optional[int]:
+    best_match = None
+    max_similarity = 0.0
+    position = knowledge_base.find(user_input)
+
+    if position is not None and question_index.has_vector(knowledge_base.row(position)):
+        # Identical text always scores 1.0, so there is no need to run the pipeline
+        best_match = position
+        max_similarity = 1.0
+        metrics.increment("exact_matches")
+    else:
+        cached = response_cache.get(user_input) if response_cache is not None else None
+        if cached is not None:
+            best_match, max_similarity = cached.position, cached.similarity
+            metrics.increment("response_cache_hits")
+        else:
+            # An answer taught while this input is scored adds rows the match never saw; the cache checks them
+            rows = len(question_index)
+            if batcher is not None:
+                row, similarity, vector = batcher.submit(user_input, question_index).result()
+            else:
+                with metrics.timer("embed"):
+                    user_doc = get_embedder()(user_input)
+                vector = user_doc.vector / user_doc.vector_norm if user_doc.vector_norm else None
+                with metrics.timer("similarity"):
+                    matches = question_index.top_k(user_doc.vector, user_doc.vector_norm, 1) if vector is not None \
+                        else []
+                row, similarity = matches[0] if matches else (None, 0.0)
+
+            if vector is None:  # Check if the user input vector is not empty
+                logging.warning(f"User input '{user_input}' resulted in an empty vector.")
+                metrics.increment("empty_vectors")
+                return None
+
+            if row is not None and similarity > 0.0:
+                best_match, max_similarity = knowledge_base.row_position(row), similarity
+            if response_cache is not None:
+                response_cache.put(user_input, best_match, max_similarity, vector, rows)
+
+    best_question = knowledge_base.question(best_match) if best_match is not None else None
+    logging.info(f"Best match for user input '{user_input}' is '{best_question}' with similarity {max_similarity}.")
     return best_match if max_similarity > 0.6 else None
 
-def get_answer_for_question(question: str, knowledge_base: Dict[str, Any]) -> Optional[str]:
-    for q in knowledge_base.get("questions", []):
-        if q.get("question") == question:
-            return q.get("answer")
-    return None
+def get_answer_for_question(question: str, knowledge_base: KnowledgeBase) -> Optional[str]:
+    position = knowledge_base.find(question)
+    return knowledge_base.answer(position) if position is not None else None
 
 def get_user_input() -> str:
     try:
@@ -98,92 +433,95 @@ def get_user_input() -> str:
         logging.info("User initiated exit.")
         raise
 
-def add_new_answer(knowledge_base: Dict[str, Any], user_question: str, new_answer: str):
-    knowledge_base.setdefault("questions", []).append({"question": user_question, "answer": new_answer})
-    save_knowledge_base('knowledge_base.json', knowledge_base)
+def index_new_entry(knowledge_base: KnowledgeBase, position: int, question_index: Optional[QuestionIndex] = None,
+                    response_cache: Optional[ResponseCache] = None):
+    """Bring the index and the response cache up to date with an entry just added to the knowledge base."""
+    row = knowledge_base.row(position)
+    # A repeated question shares the existing row, so only new text needs embedding
+    if question_index is not None and row == len(question_index):
+        question_index.add(knowledge_base.question(position), get_embedder())
+        if response_cache is not None:
+            response_cache.entry_added(position, question_index.matrix[row], row)
+
+def learn_answer(knowledge_base: KnowledgeBase, user_question: str, new_answer: str,
+                 question_index: Optional[QuestionIndex] = None, response_cache: Optional[ResponseCache] = None,
+                 knowledge_base_file: str = 'knowledge_base.json', writer: Optional[BackgroundWriter] = None) -> int:
+    """Add a taught answer to the knowledge base, its index and the response cache, and persist it."""
+    position = knowledge_base.add(user_question, new_answer)
+    index_new_entry(knowledge_base, position, question_index, response_cache)
+    entry = knowledge_base.entry(position)
+    if writer is not None:
+        # The reply does not wait on disk; the writer batches entries and flushes them shortly
+        writer.submit(entry)
+    else:
+        try:
+            append_to_knowledge_base(knowledge_base_file, [entry])
+        except Exception as e:
+            logging.error(f"Error saving new answer for question '{user_question}': {e}")
     logging.info(f"New answer added for question '{user_question}'.")
+    return position
+
+def add_new_answer(knowledge_base: KnowledgeBase, user_question: str, new_answer: str,
+                   question_index: Optional[QuestionIndex] = None, response_cache: Optional[ResponseCache] = None,
+                   knowledge_base_file: str = 'knowledge_base.json', writer: Optional[BackgroundWriter] = None):
+    learn_answer(knowledge_base, user_question, new_answer, question_index, response_cache, knowledge_base_file, writer)
     print('Bot: Thank you! I learned a new response!')
 
-def clear_log():
+def clear_log_file() -> bool:
     try:
         open('chatbot.log', 'w').close()
         logging.info("Log file cleared successfully.")
-        print('Log file cleared successfully.')
+        return True
     except Exception as e:
         logging.error(f"Error clearing log file: {e}")
+        return False
+
+def clear_log():
+    if clear_log_file():
+        print('Log file cleared successfully.')
+    else:
         print('Error clearing log file.')
 
 def chat_bot():
-    knowledge_base_file = 'knowledge_base.json'
-    knowledge_base: Dict[str, Any] = load_knowledge_base(knowledge_base_file)
+    """Chat at the terminal: a thin adapter that moves text between input()/print() and a ChatEngine."""
+    try:
+        from .chat_engine import ChatEngine, ChatService, ChatSession
+    except ImportError:
+        from chat_engine import ChatEngine, ChatService, ChatSession
 
-    while True:
-        try:
-            user_input: str = get_user_input()
+    # One user at a time gains nothing from batching, so questions are matched straight away
+    service = ChatService('knowledge_base.json', batch_window=0)
+    engine = ChatEngine(service)
+    session = ChatSession()
+    loop = asyncio.new_event_loop()
 
-            if user_input.lower() == 'quit':
-                logging.info("Chatbot session ended by Ray.")
-                print('\nBot: Goodbye!')
-                break
-            elif user_input.lower() == 'exit':
-                logging.info("Chatbot session ended by Ray.")
+    try:
+        while True:
+            try:
+                if session.pending_question is not None:
+                    user_input: str = input('Type the answer or "skip" to skip: ')
+                else:
+                    user_input = get_user_input()
+
+                response = loop.run_until_complete(engine.process(user_input, session))
+                if response.end_session:
+                    print(f'\nBot: {response.text}')
+                    break
+                if response.text:
+                    print(f'Bot: {response.text}')
+
+            except KeyboardInterrupt:
+                logging.info("Chatbot session interrupted by Ray.")
                 print('\nBot: Goodbye!')
                 break
-            elif user_input.lower() == 'reload':
-                knowledge_base = load_knowledge_base(knowledge_base_file)
-                print('Bot: Knowledge base reloaded.')
-                logging.info("Knowledge base reloaded by Ray.")
-                continue
-            elif user_input.lower() == 'reboot':
-                logging.info("Chatbot reboot initiated by Ray.")
-                reboot_logger.info("Reboot process started.")
-                try:
-                    print('Bot: Rebooting...')
-                    reboot_logger.info("Rebooting the chatbot program.")
-
-                    # Open the current script and read it all at once
-                    with open(sys.argv[0], 'r') as script_file:
-                        script_content = script_file.read()
-                        reboot_logger.info(script_content)
-                        exec(script_content)
-
-                    reboot_logger.info("Chatbot reboot completed successfully.")
-                except Exception as e:
-                    reboot_logger.error(f"Error during reboot: {e}")
-                    print('Bot: An error occurred during reboot.')
-                break
-            elif user_input.lower() == 'clear log':
-                clear_log()
-                continue
-
-            questions_list = [q.get("question", "") for q in knowledge_base.get("questions", [])]
-            best_match: Optional[str] = find_best_match(user_input, questions_list)
-
-            if best_match:
-                answer: Optional[str] = get_answer_for_question(best_match, knowledge_base)
-                if answer:
-                    logging.info(f"Responding to question '{best_match}' with answer '{answer}'.")
-                    print(f'Bot: {answer}')
-                else:
-                    logging.warning(f"No answer found for the matched question '{best_match}'.")
-                    print('Bot: Sorry, I don\'t know the answer. Can you please educate me?')
-                    new_answer: str = input('Type the answer or "skip" to skip: ')
-                    if new_answer.lower() != 'skip':
-                        add_new_answer(knowledge_base, user_input, new_answer)
-            else:
-                logging.warning(f"No match found for the user question '{user_input}'.")
-                print('Bot: Sorry, I don\'t know the answer. Can you please educate me?')
-                new_answer: str = input('Type the answer or "skip" to skip: ')
-                if new_answer.lower() != 'skip':
-                    add_new_answer(knowledge_base, user_input, new_answer)
-
-        except KeyboardInterrupt:
-            logging.info("Chatbot session interrupted by Ray.")
-            print('\nBot: Goodbye!')
-            break
-        except Exception as e:
-            logging.error(f"Unexpected error: {e}")
-            print('Bot: An unexpected error occurred. Please try again.')
+            except Exception as e:
+                logging.error(f"Unexpected error: {e}")
+                print('Bot: An unexpected error occurred. Please try again.')
+    finally:
+        service.close()
+        loop.close()
+
+    logging.info(f"Response cache stats: {service.state[2].stats()}")
 
 if __name__ == '__main__':
     try:
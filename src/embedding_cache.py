@@ -0,0 +1,144 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .journal import FOLDED_JOURNAL_KEY, atomic_write
+    from .question_index import EMBED_BATCH_SIZE, EMBED_PROCESSES, QuestionIndex, embed_questions
+except ImportError:
+    from journal import FOLDED_JOURNAL_KEY, atomic_write
+    from question_index import EMBED_BATCH_SIZE, EMBED_PROCESSES, QuestionIndex, embed_questions
+
+CACHE_FORMAT_VERSION = 1
+
+
+def cache_paths(knowledge_base_file: str) -> Tuple[str, str]:
+    """Return the (matrix, manifest) sidecar paths for a knowledge base file."""
+    base, _ = os.path.splitext(knowledge_base_file)
+    return f"{base}.vectors.npy", f"{base}.vectors.json"
+
+
+def question_hash(question: str) -> str:
+    return hashlib.blake2b(question.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def model_id(nlp: Any) -> str:
+    meta = nlp.meta
+    return f"{meta.get('lang', '')}_{meta.get('name', '')}-{meta.get('version', '')}:{nlp.vocab.vectors_length}"
+
+
+def read_cache(knowledge_base_file: str, nlp: Any) -> Optional[Tuple[List[str], np.ndarray]]:
+    """Return the cached question hashes and a read-only memory map of their vectors.
+
+    Returns None when there is no cache, it is unreadable, or it was built with another model.
+    """
+    matrix_path, manifest_path = cache_paths(knowledge_base_file)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, 'r') as file:
+            manifest: Dict[str, Any] = json.load(file)
+        matrix = np.load(matrix_path, mmap_mode='r')
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable embedding cache for '{knowledge_base_file}': {e}")
+        return None
+
+    hashes = manifest.get("hashes", [])
+    if (manifest.get("version") != CACHE_FORMAT_VERSION or manifest.get("model") != model_id(nlp)
+            or matrix.shape != (len(hashes), nlp.vocab.vectors_length)):
+        logging.info(f"Embedding cache for '{knowledge_base_file}' is stale and will be rebuilt.")
+        return None
+    return hashes, matrix
+
+
+def write_cache(knowledge_base_file: str, nlp: Any, hashes: List[str], matrix: np.ndarray):
+    matrix_path, manifest_path = cache_paths(knowledge_base_file)
+    manifest = {"version": CACHE_FORMAT_VERSION, "model": model_id(nlp), "hashes": hashes}
+    try:
+        # Drop the old manifest first so a crash between the two renames leaves no cache rather
+        # than a manifest that describes the wrong matrix
+        try:
+            os.remove(manifest_path)
+        except FileNotFoundError:
+            pass
+        # Uniquely named temporary files, as the watcher, a manual reload or several workers may write at once
+        with atomic_write(matrix_path, 'wb') as file:
+            np.save(file, matrix)
+        with atomic_write(manifest_path) as file:
+            json.dump(manifest, file)
+    except OSError as e:
+        logging.error(f"Error writing embedding cache for '{knowledge_base_file}': {e}")
+
+
+def load_question_index(knowledge_base_file: str, questions: List[str], nlp: Any, batch_size: Optional[int] = None,
+                        n_process: Optional[int] = None,
+                        known_vector: Optional[Callable[[str], Optional[np.ndarray]]] = None) -> QuestionIndex:
+    """Build a QuestionIndex, reusing cached vectors and embedding only new or changed questions.
+
+    `known_vector` can supply rows the cache does not have, such as those of the index being reloaded.
+    """
+    hashes = [question_hash(question) for question in questions]
+    cached = read_cache(knowledge_base_file, nlp)
+
+    if cached is not None and cached[0] == hashes:
+        logging.info(f"Embedding cache hit for all {len(hashes)} questions.")
+        return QuestionIndex(cached[1])
+
+    cached_rows: Dict[str, int] = {}
+    if cached is not None:
+        for row, cached_hash in enumerate(cached[0]):
+            cached_rows.setdefault(cached_hash, row)
+
+    matrix = np.zeros((len(questions), nlp.vocab.vectors_length), dtype=np.float32)
+    missing: List[int] = []
+    for position, current_hash in enumerate(hashes):
+        row = cached_rows.get(current_hash)
+        if row is not None:
+            matrix[position] = cached[1][row]
+            continue
+        vector = known_vector(questions[position]) if known_vector is not None else None
+        if vector is None:
+            missing.append(position)
+        else:
+            matrix[position] = vector
+
+    if missing:
+        matrix[missing] = embed_questions([questions[position] for position in missing], nlp,
+                                          batch_size=batch_size, n_process=n_process)
+    logging.info(f"Embedding cache reused {len(questions) - len(missing)} questions and embedded {len(missing)}.")
+
+    write_cache(knowledge_base_file, nlp, hashes, matrix)
+    return QuestionIndex(matrix)
+
+
+def main():
+    """Warm the embedding cache offline, e.g. before deploying a large knowledge base."""
+    try:
+        from .chatbot import TokenVectorCache, init_logging, load_nlp, read_journal, stream_knowledge_base
+    except ImportError:
+        from chatbot import TokenVectorCache, init_logging, load_nlp, read_journal, stream_knowledge_base
+
+    parser = argparse.ArgumentParser(description="Build the embedding cache for a knowledge base file.")
+    parser.add_argument("knowledge_base_file", nargs="?", default="knowledge_base.json")
+    parser.add_argument("--model", default=os.environ.get("CHATBOT_SPACY_MODEL", "en_core_web_md"))
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--n-process", type=int, default=EMBED_PROCESSES)
+    args = parser.parse_args()
+
+    init_logging()
+    nlp = load_nlp(args.model)
+    embedder = TokenVectorCache(nlp) if TokenVectorCache.supports(nlp) else nlp
+    knowledge_base = stream_knowledge_base(args.knowledge_base_file)
+    knowledge_base.extend(read_journal(args.knowledge_base_file, knowledge_base.other_value(FOLDED_JOURNAL_KEY)))
+    question_index = load_question_index(args.knowledge_base_file, knowledge_base.row_questions(), embedder,
+                                         batch_size=args.batch_size, n_process=args.n_process)
+    print(f"Embedding cache ready for {len(question_index)} questions.")
+
+
+if __name__ == '__main__':
+    main()
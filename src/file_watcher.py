@@ -0,0 +1,71 @@
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    from .snapshot import source_stamp
+except ImportError:
+    from snapshot import source_stamp
+
+# Seconds between checks of the knowledge base file; 0 turns hot reloading off
+RELOAD_INTERVAL = float(os.environ.get("CHATBOT_RELOAD_INTERVAL", "1.0"))
+
+
+class FileWatcher:
+    """Polls a file and runs `rebuild` on a daemon thread whenever it changes.
+
+    The rebuilt result is not applied here: `take()` hands it to the owner, which swaps
+    it in at a safe point. If `rebuild` raises, the error is logged and the owner keeps
+    what it has until the file changes again.
+    """
+
+    def __init__(self, path: str, rebuild: Callable[[], Any], interval: float = RELOAD_INTERVAL,
+                 stamp: Optional[Dict[str, int]] = None):
+        self.path = path
+        self.rebuild = rebuild
+        self.interval = interval
+        self._stamp = stamp if stamp is not None else source_stamp(path)
+        self._ready: Optional[Tuple[Dict[str, int], Any]] = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='knowledge-base-watcher', daemon=True)
+        self._thread.start()
+
+    def take(self) -> Optional[Tuple[Dict[str, int], Any]]:
+        """Return the latest (stamp, result) rebuilt since the last call, if any."""
+        with self._lock:
+            ready, self._ready = self._ready, None
+        return ready
+
+    def expect(self, before: Optional[Dict[str, int]], after: Optional[Dict[str, int]]):
+        """Record a change made by the owner itself so that it does not trigger a rebuild."""
+        with self._lock:
+            if self._stamp == before:
+                self._stamp = after
+
+    def invalidate(self):
+        """Force a rebuild on the next poll, e.g. when a result turned out to be outdated."""
+        with self._lock:
+            self._stamp = None
+
+    def close(self):
+        self._closed.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._closed.wait(self.interval):
+            stamp = source_stamp(self.path)
+            with self._lock:
+                if stamp is None or stamp == self._stamp:
+                    # A missing file is left alone: the knowledge base already loaded keeps serving
+                    continue
+                self._stamp = stamp
+            logging.info(f"Change detected in '{self.path}', rebuilding in the background.")
+            try:
+                result = self.rebuild()
+            except Exception as e:
+                logging.error(f"Error rebuilding after a change to '{self.path}': {e}")
+                continue
+            with self._lock:
+                self._ready = (stamp, result)
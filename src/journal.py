@@ -0,0 +1,334 @@
+import json
+import logging
+import os
+import secrets
+import stat
+import tempfile
+from contextlib import contextmanager, nullcontext
+from typing import IO, Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows); only a single process may write a knowledge base there
+    fcntl = None
+
+# Fold the journal back into the JSON snapshot after this many appended entries
+JOURNAL_COMPACT_EVERY = int(os.environ.get("CHATBOT_JOURNAL_COMPACT_EVERY", "100"))
+
+# Top-level key of the JSON snapshot naming the journal last folded into it and how many of its entries
+FOLDED_JOURNAL_KEY = "folded_journal"
+
+# Number of entries currently in each journal, so appends never have to re-read the file
+_journal_lengths: Dict[str, int] = {}
+
+
+def journal_path(file_path: str) -> str:
+    base, _ = os.path.splitext(file_path)
+    return f"{base}.journal.jsonl"
+
+
+def journal_lock_path(file_path: str) -> str:
+    base, _ = os.path.splitext(file_path)
+    return f"{base}.journal.lock"
+
+
+def rebuild_lock_path(file_path: str) -> str:
+    base, _ = os.path.splitext(file_path)
+    return f"{base}.rebuild.lock"
+
+
+def sessions_lock_path(file_path: str) -> str:
+    base, _ = os.path.splitext(file_path)
+    return f"{base}.sessions.lock"
+
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+@contextmanager
+def journal_lock(file_path: str, exclusive: bool = True) -> Iterator[None]:
+    """Hold an advisory lock shared by every process that writes or follows this journal.
+
+    Appending and compacting take it exclusively. While it is held exclusively the cached
+    journal length is dropped, because another process may have appended or compacted.
+    """
+    with _flock(journal_lock_path(file_path), exclusive):
+        if exclusive:
+            _journal_lengths.pop(journal_path(file_path), None)
+        yield
+
+
+@contextmanager
+def rebuild_lock(file_path: str) -> Iterator[None]:
+    """Hold an exclusive advisory lock while one of the processes sharing a file rebuilds its snapshot.
+
+    Separate from journal_lock, so answers can still be taught while a rebuild runs.
+    """
+    with _flock(rebuild_lock_path(file_path), exclusive=True):
+        yield
+
+
+@contextmanager
+def sessions_lock(file_path: str, exclusive: bool = True) -> Iterator[None]:
+    """Hold an advisory lock over the chat sessions that the processes serving a file share."""
+    with _flock(sessions_lock_path(file_path), exclusive):
+        yield
+
+
+@contextmanager
+def _flock(lock_path: str, exclusive: bool) -> Iterator[None]:
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_journal(file_path: str, folded: Any = None) -> List[Dict[str, Any]]:
+    """Return the entries appended since the last snapshot, skipping a torn final line.
+
+    `folded` is the snapshot's FOLDED_JOURNAL_KEY value: the entries it says were already
+    folded into the snapshot are left out.
+    """
+    journal_id, entries = _read_journal(journal_path(file_path))
+    return entries[folded_entries(journal_id, folded):]
+
+
+def _read_journal(path: str) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    journal_id = None
+    entries: List[Dict[str, Any]] = []
+    if os.path.exists(path):
+        with open(path, 'r') as journal:
+            for line_number, line in enumerate(journal, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning(f"Skipping unreadable line {line_number} in journal '{path}'.")
+                    continue
+                if _is_header(entry):
+                    journal_id = entry["journal_id"]
+                else:
+                    entries.append(entry)
+    _journal_lengths[path] = len(entries)
+    return journal_id, entries
+
+
+def _is_header(entry: Any) -> bool:
+    # Every journal starts with a line naming it, so a snapshot can say which journal it folded
+    return isinstance(entry, dict) and list(entry) == ["journal_id"]
+
+
+def folded_entries(journal_id: Optional[str], folded: Any) -> int:
+    """How many entries at the start of the journal `journal_id` the snapshot marker `folded` covers."""
+    if journal_id is None or not isinstance(folded, dict) or folded.get("journal_id") != journal_id:
+        return 0
+    return int(folded.get("entries", 0))
+
+
+def fold_marker(file_path: str) -> Optional[Dict[str, Any]]:
+    """The FOLDED_JOURNAL_KEY value for a snapshot that holds every entry now in the journal."""
+    journal_id, entries = _read_journal(journal_path(file_path))
+    return _fold_marker(journal_id, entries)
+
+
+def _fold_marker(journal_id: Optional[str], entries: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    return {"journal_id": journal_id, "entries": len(entries)} if journal_id is not None else None
+
+
+def journal_length(file_path: str) -> int:
+    path = journal_path(file_path)
+    if path not in _journal_lengths:
+        read_journal(file_path)
+    return _journal_lengths[path]
+
+
+def _drop_torn_tail(journal: BinaryIO, path: str):
+    """Truncate a final line left without its newline by a writer that crashed mid-append.
+
+    Appending after it would glue the next entry onto the torn line, and both would then be
+    skipped as one unreadable line.
+    """
+    size = journal.seek(0, os.SEEK_END)
+    if not size:
+        return
+    journal.seek(size - 1)
+    if journal.read(1) == b'\n':
+        return
+    end = size
+    while end > 0:
+        start = max(0, end - 4096)
+        journal.seek(start)
+        newline = journal.read(end - start).rfind(b'\n')
+        if newline >= 0:
+            end = start + newline + 1
+            break
+        end = start
+    logging.warning(f"Dropping a torn final line of {size - end} bytes from journal '{path}'.")
+    journal.truncate(end)
+
+
+def append_journal(file_path: str, entries: List[Dict[str, Any]]):
+    """Append entries as JSON Lines and fsync, so an acknowledged lesson survives a crash."""
+    path = journal_path(file_path)
+    length = journal_length(file_path)
+    with open(path, 'ab+') as journal:
+        _drop_torn_tail(journal, path)
+        lines = [json.dumps(entry) + '\n' for entry in entries]
+        if not journal.tell():
+            lines.insert(0, json.dumps({"journal_id": secrets.token_hex(8)}) + '\n')
+        journal.write(''.join(lines).encode('utf-8'))
+        journal.flush()
+        os.fsync(journal.fileno())
+    _journal_lengths[path] = length + len(entries)
+
+
+def clear_journal(file_path: str):
+    path = journal_path(file_path)
+    if os.path.exists(path):
+        os.remove(path)
+    _journal_lengths[path] = 0
+
+
+def _replaced_file_mode(file_path: str) -> int:
+    try:
+        return stat.S_IMODE(os.stat(file_path).st_mode)
+    except FileNotFoundError:
+        # What open() would have created; os.umask can only be read by setting it
+        umask = os.umask(0o022)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+@contextmanager
+def atomic_write(file_path: str, mode: str = 'w', durable: bool = True) -> Iterator[IO[Any]]:
+    """Open a temporary file next to `file_path` and rename it over `file_path` once the block succeeds.
+
+    The temporary name is unique, so concurrent writers never share one, and the file gets the
+    permissions of the file it replaces (or the usual umask default) rather than mkstemp's 0600.
+    Without `durable` the data is not synced to disk first: readers still never see a partial
+    file, but a power cut may lose the write.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    descriptor, temp_path = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=directory)
+    try:
+        os.chmod(temp_path, _replaced_file_mode(file_path))
+        with os.fdopen(descriptor, mode) as file:
+            yield file
+            file.flush()
+            if durable:
+                os.fsync(file.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_json_atomic(file_path: str, data: Dict[str, Any]):
+    """Write JSON to a temporary file in the same directory and rename it over `file_path`."""
+    with atomic_write(file_path) as file:
+        json.dump(data, file, indent=2)
+
+
+def set_fold_marker(data: Dict[str, Any], marker: Optional[Dict[str, Any]]):
+    if marker is None:
+        data.pop(FOLDED_JOURNAL_KEY, None)
+    else:
+        data[FOLDED_JOURNAL_KEY] = marker
+
+
+def compact_journal(file_path: str):
+    """Fold the journal into the JSON snapshot on disk and clear it.
+
+    Works from the files rather than the in-memory knowledge base, so it is safe to run from
+    a writer thread while the chat loop keeps adding entries. A snapshot that cannot be parsed
+    raises and leaves the journal untouched. The snapshot records which journal entries it
+    folded, so a crash before the journal is cleared never replays them a second time.
+    """
+    data: Dict[str, Any] = {}
+    if os.path.exists(file_path):
+        with open(file_path, 'r') as file:
+            data = json.load(file)
+    journal_id, entries = _read_journal(journal_path(file_path))
+    data.setdefault("questions", []).extend(entries[folded_entries(journal_id, data.get(FOLDED_JOURNAL_KEY)):])
+    set_fold_marker(data, _fold_marker(journal_id, entries))
+    write_json_atomic(file_path, data)
+    clear_journal(file_path)
+    logging.info(f"Compacted journal into knowledge base snapshot '{file_path}'.")
+
+
+class JournalFollower:
+    """Reads a journal incrementally, for processes that share it with other writers.
+
+    Each `read_new()` returns the entries appended since the previous call. When the journal
+    is compacted into the JSON file, reading starts again from the new journal; the compacted
+    entries themselves arrive with the reloaded JSON file.
+    """
+
+    def __init__(self, file_path: str, folded: Any = None):
+        self.file_path = file_path
+        self.path = journal_path(file_path)
+        self.restart(folded)
+
+    def restart(self, folded: Any = None):
+        """Read the journal from the start again, e.g. after reloading the JSON file.
+
+        `folded` is the reloaded snapshot's FOLDED_JOURNAL_KEY value, as for read_journal.
+        """
+        self._offset = 0
+        # The snapshot's fold marker, applied when the journal's header line is read
+        self.folded = folded
+        self._skip = 0
+        self._source = _file_stamp(self.file_path)
+        self._checked: Optional[Tuple[Any, Any]] = None
+
+    def read_new(self, lock: bool = True) -> List[Dict[str, Any]]:
+        """Return the entries appended since the last call; pass `lock=False` when already holding journal_lock."""
+        # Two stat calls answer the common case, where nothing was written since the last read
+        if (_file_stamp(self.path), _file_stamp(self.file_path)) == self._checked:
+            return []
+
+        entries: List[Dict[str, Any]] = []
+        with journal_lock(self.file_path, exclusive=False) if lock else nullcontext():
+            source = _file_stamp(self.file_path)
+            if source != self._source:
+                # Compacted: whatever this process had not read yet is now in the JSON file
+                self._source, self._offset, self.folded, self._skip = source, 0, None, 0
+            try:
+                with open(self.path, 'rb') as journal:
+                    journal.seek(self._offset)
+                    data = journal.read()
+            except FileNotFoundError:
+                data = b''
+            # A torn final line is left for the next read: either its writer finishes it, or the next
+            # append_journal truncates it back to this offset before writing after it
+            complete = data[:data.rfind(b'\n') + 1]
+            for line in complete.splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning(f"Skipping unreadable line in journal '{self.path}'.")
+                    continue
+                if _is_header(entry):
+                    self._skip = folded_entries(entry["journal_id"], self.folded)
+                elif self._skip:
+                    self._skip -= 1
+                else:
+                    entries.append(entry)
+            self._offset += len(complete)
+            self._checked = (_file_stamp(self.path), source)
+        return entries
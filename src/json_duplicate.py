@@ -5,6 +5,11 @@ import enchant
 import os
 from datetime import datetime
 
+try:
+    from .json_stream import iter_questions
+except ImportError:
+    from json_stream import iter_questions
+
 # Function to write log messages to a file with timestamps and line numbers
 def write_log(message, line_number=None):
     log_file_path = 'json_duplicates.log'
@@ -25,21 +30,13 @@ write_log("Script started.")
 
 # Get the absolute path of the current directory
 current_directory = os.path.abspath(os.path.dirname(__file__))
+knowledge_base_file = os.path.join(current_directory, 'knowledge_base.json')
 
-try:
-    # Load JSON data
-    write_log("Loading JSON data...")
-    with open(os.path.join(current_directory, 'knowledge_base.json'), 'r') as file:
-        data = json.load(file)
-    write_log("JSON data loaded successfully.")
-except FileNotFoundError:
+# The entries are only read once the check starts, so fail before starting the language tool server
+if not os.path.isfile(knowledge_base_file):
     write_log("Error: File 'knowledge_base.json' not found. Please check the file path.")
     print("Error: File 'knowledge_base.json' not found. Please check the file path.")
-    raise
-except json.JSONDecodeError as e:
-    write_log(f"Error decoding JSON: {e}")
-    print(f"Error decoding JSON: {e}")
-    raise
+    raise FileNotFoundError(f"Knowledge base file '{knowledge_base_file}' not found.")
 
 # Initialize language tool for grammar checking
 write_log("Initializing language tool...")
@@ -51,38 +48,41 @@ write_log("Initializing spell checker...")
 spell_checker = enchant.Dict("en_US")
 write_log("Spell checker initialized.")
 
-# Extract questions and answers
-write_log("Extracting questions and answers...")
-questions = [item['question'] for item in data['questions']]
-answers = [item['answer'] for item in data['questions']]
-write_log("Questions and answers extracted successfully.")
-
-# Check for duplicate questions
-write_log("Checking for duplicate questions...")
+# Check for duplicate questions and answers in a single pass over the streamed entries. Only
+# the distinct questions and answers are kept, never the whole parsed document at once
 unique_questions = set()
 duplicate_questions = set()
-
-for line_number, question in enumerate(questions, start=1):
-    matches = tool.check(question)
-    if matches or not spell_checker.check(question):
-        write_log(f"Potential error found in question: {question}", line_number)
-    if question in unique_questions:
-        duplicate_questions.add(question)
-    else:
-        unique_questions.add(question)
-write_log("Duplicate questions check complete.")
-
-# Check for duplicate answers
-write_log("Checking for duplicate answers...")
 unique_answers = set()
 duplicate_answers = set()
 
-for line_number, answer in enumerate(answers, start=1):
-    if answer in unique_answers:
-        duplicate_answers.add(answer)
-    else:
-        unique_answers.add(answer)
-write_log("Duplicate answers check complete.")
+try:
+    write_log("Checking for duplicate questions and answers...")
+    entries = iter_questions(knowledge_base_file)
+    for line_number, item in enumerate(entries, start=1):
+        question = item['question']
+        answer = item['answer']
+
+        matches = tool.check(question)
+        if matches or not spell_checker.check(question):
+            write_log(f"Potential error found in question: {question}", line_number)
+        if question in unique_questions:
+            duplicate_questions.add(question)
+        else:
+            unique_questions.add(question)
+
+        if answer in unique_answers:
+            duplicate_answers.add(answer)
+        else:
+            unique_answers.add(answer)
+    write_log("Duplicate questions and answers check complete.")
+except FileNotFoundError:
+    write_log("Error: File 'knowledge_base.json' not found. Please check the file path.")
+    print("Error: File 'knowledge_base.json' not found. Please check the file path.")
+    raise
+except json.JSONDecodeError as e:
+    write_log(f"Error decoding JSON: {e}")
+    print(f"Error decoding JSON: {e}")
+    raise
 
 # Log results
 if duplicate_questions:
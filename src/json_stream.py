@@ -0,0 +1,121 @@
+import json
+import os
+import re
+from typing import Any, Dict, Iterator, Optional, TextIO
+
+# Characters read per chunk; memory stays around this plus the largest single entry
+STREAM_CHUNK_SIZE = int(os.environ.get("CHATBOT_STREAM_CHUNK_SIZE", "65536"))
+
+_decoder = json.JSONDecoder()
+_NON_WHITESPACE = re.compile(r'[^ \t\n\r]')
+_DELIMITERS = ',:]}'
+
+
+class _Reader:
+    """Sliding window over a text file that decodes one JSON value at a time."""
+
+    def __init__(self, file: TextIO, chunk_size: int):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        # Read at least as much as is still pending, so a value spanning many chunks is re-scanned
+        # a logarithmic rather than linear number of times
+        chunk = self.file.read(max(self.chunk_size, len(self.buffer) - self.position))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self.buffer, self.position)
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character, or '' at the end of the file."""
+        while True:
+            match = _NON_WHITESPACE.search(self.buffer, self.position)
+            if match:
+                self.position = match.start()
+                return match.group()
+            self.position = len(self.buffer)
+            if not self._fill():
+                return ''
+
+    def expect(self, characters: str) -> str:
+        character = self.peek()
+        if not character or character not in characters:
+            raise self.error(f"Expecting one of {characters!r}")
+        self.position += 1
+        return character
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                # Most likely the value continues in the next chunk; at the end of the file it is a real error
+                if not self._fill():
+                    raise
+                continue
+            following = _NON_WHITESPACE.search(self.buffer, end)
+            # A number cut at a chunk boundary ("1." + "5") decodes early, so only trust it once a delimiter follows
+            complete = following is not None and (
+                following.group() in _DELIMITERS or not isinstance(value, (int, float)))
+            if complete:
+                # Leave the position on the delimiter so the caller's next peek is immediate
+                self.position = following.start()
+                return value
+            if not self._fill():
+                self.position = end
+                return value
+
+
+def _iter_array(reader: _Reader) -> Iterator[Any]:
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.expect(']')
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(',]') == ']':
+            return
+
+
+def iter_questions(file_path: str, other_values: Optional[Dict[str, Any]] = None,
+                   chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yield the entries of a knowledge base's "questions" array one at a time.
+
+    Only the current chunk and entry are held in memory, so multi-GB exports can be processed
+    in a single pass. Any other top-level values are stored in `other_values` when it is given.
+    Raises FileNotFoundError and json.JSONDecodeError like json.load, though a decode error
+    may only surface after the entries before it have been yielded.
+    """
+    with open(file_path, 'r') as file:
+        reader = _Reader(file, chunk_size)
+        reader.expect('{')
+        if reader.peek() == '}':
+            reader.expect('}')
+        else:
+            while True:
+                key = reader.value()
+                if not isinstance(key, str):
+                    raise reader.error("Expecting property name enclosed in double quotes")
+                reader.expect(':')
+                if key == "questions" and reader.peek() == '[':
+                    yield from _iter_array(reader)
+                else:
+                    value = reader.value()
+                    if other_values is not None:
+                        other_values[key] = value
+                if reader.expect(',}') == '}':
+                    break
+        if reader.peek():
+            raise reader.error("Extra data")
@@ -0,0 +1,139 @@
+from array import array
+from typing import Any, Dict, Iterable, List, MutableSequence, Optional
+
+
+class KnowledgeBase:
+    """The loaded knowledge base, stored column by column instead of as a list of dicts.
+
+    Each entry is a slot in the `question` and `answer` columns plus a vector row id.
+    Entries that share the same question text share one row, so a QuestionIndex built
+    from `row_questions()` embeds every distinct question once. A row resolves to the
+    first entry with that text, as with the old linear scan. The dict shape is only
+    rebuilt by `to_dict()` when the knowledge base is saved.
+    """
+
+    __slots__ = ("_questions", "_answers", "_rows", "_row_positions", "_row_by_question",
+                 "_entry_fields", "_other_values")
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        data = data if data is not None else {}
+        self._questions: List[str] = []
+        self._answers: List[Optional[str]] = []
+        # Entry position -> vector row id, and vector row id -> first entry position
+        self._rows = array('q')
+        self._row_positions = array('q')
+        self._row_by_question: Dict[str, int] = {}
+        # Fields other than question and answer, kept only for the entries that have them
+        self._entry_fields: Dict[int, Dict[str, Any]] = {}
+        self._other_values = {key: value for key, value in data.items() if key != "questions"}
+        self.extend(data.get("questions") or [])
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict[str, Any]],
+                     other_values: Optional[Dict[str, Any]] = None) -> 'KnowledgeBase':
+        """Build from entries read one at a time, e.g. by iter_questions, without a list of dicts in between.
+
+        `other_values` is kept by reference, so a streaming reader can still be filling it in
+        while the entries are consumed.
+        """
+        knowledge_base = cls()
+        if other_values is not None:
+            knowledge_base._other_values = other_values
+        knowledge_base.extend(entries)
+        return knowledge_base
+
+    @classmethod
+    def from_columns(cls, questions: MutableSequence[str], answers: MutableSequence[Optional[str]],
+                     rows: MutableSequence[int], row_positions: MutableSequence[int], row_by_question: Any,
+                     entry_fields: Dict[int, Dict[str, Any]], other_values: Dict[str, Any]) -> 'KnowledgeBase':
+        """Wrap existing columns, e.g. the string tables of a compiled snapshot, without copying them.
+
+        `row_by_question` only needs `get` and item assignment, so it can be a lookup
+        structure other than a dict.
+        """
+        knowledge_base = cls.__new__(cls)
+        knowledge_base._questions = questions
+        knowledge_base._answers = answers
+        knowledge_base._rows = rows
+        knowledge_base._row_positions = row_positions
+        knowledge_base._row_by_question = row_by_question
+        knowledge_base._entry_fields = entry_fields
+        knowledge_base._other_values = other_values
+        return knowledge_base
+
+    def columns(self) -> Dict[str, Any]:
+        """The underlying columns, for writing a compiled snapshot."""
+        return {
+            "questions": self._questions,
+            "answers": self._answers,
+            "rows": self._rows,
+            "row_positions": self._row_positions,
+            "entry_fields": self._entry_fields,
+            "other_values": self._other_values,
+        }
+
+    def __len__(self) -> int:
+        return len(self._questions)
+
+    def row_count(self) -> int:
+        return len(self._row_positions)
+
+    def questions(self) -> List[str]:
+        return list(self._questions)
+
+    def row_questions(self) -> List[str]:
+        """The distinct question texts, in vector row order."""
+        return [self._questions[position] for position in self._row_positions]
+
+    def find(self, question: str) -> Optional[int]:
+        row = self._row_by_question.get(question)
+        return None if row is None else self._row_positions[row]
+
+    def row(self, position: int) -> int:
+        return self._rows[position]
+
+    def row_position(self, row: int) -> int:
+        return self._row_positions[row]
+
+    def question(self, position: int) -> str:
+        return self._questions[position]
+
+    def answer(self, position: int) -> Optional[str]:
+        return self._answers[position]
+
+    def other_value(self, key: str) -> Any:
+        """A top-level value of the knowledge base file other than "questions", or None."""
+        return self._other_values.get(key)
+
+    def entry(self, position: int) -> Dict[str, Any]:
+        entry = {"question": self._questions[position], "answer": self._answers[position]}
+        entry.update(self._entry_fields.get(position, ()))
+        return entry
+
+    def add(self, question: str, answer: Optional[str], fields: Optional[Dict[str, Any]] = None) -> int:
+        position = len(self._questions)
+        self._questions.append(question)
+        self._answers.append(answer)
+        if fields:
+            self._entry_fields[position] = fields
+
+        row = self._row_by_question.get(question)
+        new_row = row is None
+        if new_row:
+            row = len(self._row_positions)
+            self._row_positions.append(position)
+        self._rows.append(row)
+        if new_row:
+            # Published last, so a reader on another thread that finds the question also finds its row
+            self._row_by_question[question] = row
+        return position
+
+    def extend(self, entries: Iterable[Dict[str, Any]]):
+        for entry in entries:
+            fields = {key: value for key, value in entry.items() if key not in ("question", "answer")}
+            self.add(entry.get("question", ""), entry.get("answer"), fields)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = dict(self._other_values)
+        data["questions"] = [self.entry(position) for position in range(len(self._questions))]
+        return data
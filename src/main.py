@@ -18,13 +18,20 @@ def find_best_match(user_question: str, questions: list[str]) -> str | None:
     return matches[0] if matches else None
 
 
-def get_answer_for_question(question: str, knowledge_base: dict) -> str | None:
+def index_answers(knowledge_base: dict) -> dict[str, str]:
+    # The first entry for a question wins, as in the old linear scan
+    answers: dict[str, str] = {}
     for q in knowledge_base["questions"]:
-        if q["question"] == question:
-            return q["answer"]
+        answers.setdefault(q["question"], q["answer"])
+    return answers
+
+
+def get_answer_for_question(question: str, answers: dict[str, str]) -> str | None:
+    return answers.get(question)
 
 def chat_bot():
     knowledge_base: dict = load_knowledge_base('knowledge_base.json')
+    answers: dict[str, str] = index_answers(knowledge_base)
 
     while True:
         user_input: str = input('You: ')
@@ -32,11 +39,11 @@ def chat_bot():
         if user_input.lower() == 'quit':
             break
 
-        best_match: str | None = find_best_match(user_input, [q["question"] for q in knowledge_base]["questions"])
+        best_match: str | None = find_best_match(user_input, list(answers))
 
 
         if best_match:
-            answer: str = get_answer_for_question(best_match, knowledge_base)
+            answer: str = get_answer_for_question(best_match, answers)
             print(f'Bot: {answer}')
         # else:
         #     print('Bot: Sorry I don\'t know the answer. Can you please educate me?')
@@ -52,6 +59,7 @@ def chat_bot():
 
         if new_answer.lower() != 'skip':
             knowledge_base["questions"].append({"question": user_input, "answer": new_answer})
+            answers.setdefault(user_input, new_answer)
             save_knowledge_base('knowledge_base.json', knowledge_base)
             print('Bot: Thank you! I learned a new response!')
 
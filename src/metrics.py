@@ -0,0 +1,144 @@
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    from .journal import write_json_atomic
+except ImportError:
+    from journal import write_json_atomic
+
+# Where `stats` and shutdown write the latency histograms and counters; empty turns the file off
+METRICS_FILE = os.environ.get("CHATBOT_METRICS_FILE", "chatbot_metrics.json")
+
+# Histogram buckets grow by 10% from one microsecond, so a percentile is within 10% of the true value
+_BUCKET_BASE = 1e-6
+_BUCKET_GROWTH = 1.1
+_BUCKET_COUNT = 256  # Up to about 10 hours; slower samples land in the last bucket
+_LOG_GROWTH = math.log(_BUCKET_GROWTH)
+
+
+class LatencyHistogram:
+    """Counts of durations in log-spaced buckets, from which percentiles are read.
+
+    Recording is O(1) and the memory is fixed however many samples are recorded. Not
+    thread-safe on its own; Metrics records under its lock.
+    """
+
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets: List[int] = [0] * _BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        if seconds <= _BUCKET_BASE:
+            bucket = 0
+        else:
+            bucket = min(int(math.log(seconds / _BUCKET_BASE) / _LOG_GROWTH) + 1, _BUCKET_COUNT - 1)
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction: float) -> float:
+        """Return the upper bound of the bucket holding the `fraction` quantile, capped at the slowest sample."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                if bucket == _BUCKET_COUNT - 1:
+                    return self.max
+                return min(_BUCKET_BASE * _BUCKET_GROWTH ** bucket, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        # Milliseconds, which is the scale a chat turn's stages are read at
+        return {"count": self.count,
+                "mean_ms": round(self.total / self.count * 1000, 4) if self.count else 0.0,
+                "p50_ms": round(self.percentile(0.50) * 1000, 4),
+                "p95_ms": round(self.percentile(0.95) * 1000, 4),
+                "p99_ms": round(self.percentile(0.99) * 1000, 4),
+                "max_ms": round(self.max * 1000, 4)}
+
+
+class Metrics:
+    """Named latency histograms and counters, shared by every thread in the process.
+
+    `timer("embed")` times a block into the "embed" histogram and `increment("cache_hits")`
+    bumps a counter; `snapshot()` returns both as plain data and `write()` saves it as JSON.
+    """
+
+    def __init__(self):
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def increment(self, counter: str, amount: int = 1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"pid": os.getpid(),
+                    "uptime_seconds": round(time.time() - self.started, 3),
+                    "stages": {stage: histogram.summary() for stage, histogram in sorted(self._histograms.items())},
+                    "counters": dict(sorted(self._counters.items()))}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.started = time.time()
+
+    def write(self, path: Optional[str] = None) -> Optional[str]:
+        """Save the snapshot to `path` (METRICS_FILE by default) and return the path, or None if not written."""
+        path = METRICS_FILE if path is None else path
+        if not path:
+            return None
+        try:
+            write_json_atomic(path, self.snapshot())
+        except Exception as e:
+            logging.error(f"Error writing metrics to '{path}': {e}")
+            return None
+        return path
+
+    def format(self, snapshot: Optional[Dict[str, Any]] = None) -> str:
+        """Render a snapshot (a new one by default) as the lines the `stats` command prints."""
+        snapshot = self.snapshot() if snapshot is None else snapshot
+        lines = [f"{'stage':<12}{'count':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for stage, summary in snapshot["stages"].items():
+            lines.append(f"{stage:<12}{summary['count']:>9}{summary['p50_ms']:>10.3f}{summary['p95_ms']:>10.3f}"
+                         f"{summary['p99_ms']:>10.3f}{summary['max_ms']:>10.3f}")
+        if snapshot["counters"]:
+            lines.append(', '.join(f"{counter}: {value}" for counter, value in snapshot["counters"].items()))
+        return '\n'.join(lines)
+
+
+# The process-wide instance the chatbot records into
+metrics = Metrics()
@@ -1,10 +1,14 @@
-import json
 import mysql.connector
 from mysql.connector import Error
 
+try:
+    from .json_stream import iter_questions
+except ImportError:
+    from json_stream import iter_questions
+
 def load_json(file_path):
-    with open(file_path, 'r') as file:
-        return json.load(file)
+    # Yields the question entries one at a time, so large exports are imported in constant memory
+    return iter_questions(file_path)
 
 def connect_to_database(host, database, user, password):
     try:
@@ -38,8 +42,8 @@ def insert_questions(connection, questions):
     cursor.close()
 
 def main():
-    # Load the JSON data
-    questions_data = load_json('intents.json')
+    # Stream the question entries from the JSON file
+    questions = load_json('intents.json')
 
     # Connect to the MySQL database
     connection = connect_to_database(
@@ -51,7 +55,7 @@ def main():
 
     if connection:
         # Insert questions into the database
-        insert_questions(connection, questions_data['questions'])
+        insert_questions(connection, questions)
         connection.close()
         print("Data inserted successfully and connection closed")
 
@@ -0,0 +1,117 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .metrics import metrics
+    from .question_index import QuestionIndex
+except ImportError:
+    from metrics import metrics
+    from question_index import QuestionIndex
+
+# Queries arriving within this many seconds of the first one are matched together; 0 turns batching off
+BATCH_WINDOW = float(os.environ.get("CHATBOT_BATCH_WINDOW", "0.002"))
+BATCH_MAX_SIZE = int(os.environ.get("CHATBOT_BATCH_MAX_SIZE", "64"))
+
+
+class QueryMatch(NamedTuple):
+    row: Optional[int]
+    similarity: float
+    # Normalised input vector, or None when the input has no vector
+    vector: Optional[np.ndarray]
+
+
+class QueryBatcher:
+    """Matches queries from many threads in batches on one daemon thread.
+
+    `submit()` queues a query and returns a Future. Once `window` seconds have passed since
+    the first queued query, or `max_batch` are waiting, the batch is embedded with one `pipe`
+    call and scored against each index with a single matrix-matrix product. A query waits
+    at most one window plus the time it takes to match its batch.
+    """
+
+    def __init__(self, embedder: Any, window: float = BATCH_WINDOW, max_batch: int = BATCH_MAX_SIZE):
+        self.embedder = embedder
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: List[Tuple[str, QuestionIndex, Future]] = []
+        self._first: Optional[float] = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='query-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, user_input: str, question_index: QuestionIndex) -> 'Future[QueryMatch]':
+        future: 'Future[QueryMatch]' = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("QueryBatcher is closed")
+            self._queue.append((user_input, question_index, future))
+            if self._first is None:
+                # Wake the thread so it starts timing the window from this query
+                self._first = time.monotonic()
+                self._condition.notify()
+            elif len(self._queue) >= self.max_batch:
+                self._condition.notify()
+        return future
+
+    def close(self):
+        """Stop the thread once every query already submitted has been matched."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                while len(self._queue) < self.max_batch and not self._closed:
+                    remaining = self._first + self.window - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+                self._first = time.monotonic() if self._queue else None
+            self._match(batch)
+
+    def _match(self, batch: List[Tuple[str, QuestionIndex, Future]]):
+        batch = [query for query in batch if query[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        metrics.increment("batches")
+        metrics.increment("batched_queries", len(batch))
+        try:
+            with metrics.timer("embed"):
+                docs = list(self.embedder.pipe([user_input for user_input, _, _ in batch]))
+            results: List[Optional[QueryMatch]] = [None] * len(batch)
+            # Normally every query is against the same index; a reload mid-batch splits it in two
+            groups: Dict[int, Tuple[QuestionIndex, List[int]]] = {}
+            for position, ((user_input, question_index, _), doc) in enumerate(zip(batch, docs)):
+                if not doc.vector_norm:
+                    results[position] = QueryMatch(None, 0.0, None)
+                    continue
+                groups.setdefault(id(question_index), (question_index, []))[1].append(position)
+
+            with metrics.timer("similarity"):
+                for question_index, positions in groups.values():
+                    queries = np.stack([docs[position].vector / docs[position].vector_norm
+                                        for position in positions])
+                    for position, query, (row, similarity) in zip(positions, queries,
+                                                                   question_index.best_matches(queries)):
+                        results[position] = QueryMatch(row, similarity, query)
+        except Exception as e:
+            logging.error(f"Error matching a batch of {len(batch)} queries: {e}")
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
@@ -0,0 +1,143 @@
+import logging
+import os
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .ann_index import ANN_PROBES, IVFIndex
+except ImportError:
+    from ann_index import ANN_PROBES, IVFIndex
+
+# Corpus indexing streams questions through nlp.pipe; extra processes only pay off for large corpora
+EMBED_BATCH_SIZE = int(os.environ.get("CHATBOT_EMBED_BATCH_SIZE", "256"))
+EMBED_PROCESSES = int(os.environ.get("CHATBOT_EMBED_PROCESSES", "1"))
+# Rows scored per block in batched matching, bounding the similarity buffer at this many rows per query
+SCORE_BLOCK_ROWS = 16384
+
+
+def embed_questions(questions: List[str], nlp: Any, batch_size: Optional[int] = None,
+                    n_process: Optional[int] = None) -> np.ndarray:
+    """Return a float32 matrix with one L2-normalised vector per question (zeros when empty)."""
+    batch_size = batch_size or EMBED_BATCH_SIZE
+    n_process = n_process or EMBED_PROCESSES
+    if len(questions) <= batch_size:
+        n_process = 1
+
+    matrix = np.zeros((len(questions), nlp.vocab.vectors_length), dtype=np.float32)
+    question_docs = nlp.pipe(questions, batch_size=batch_size, n_process=n_process)
+    for row, (question, question_doc) in enumerate(zip(questions, question_docs)):
+        if not question_doc.vector_norm:  # Check if the question vector is not empty
+            logging.warning(f"Question '{question}' resulted in an empty vector.")
+            continue
+        matrix[row] = question_doc.vector / question_doc.vector_norm
+    return matrix
+
+
+class QuestionIndex:
+    """Matrix of L2-normalised question vectors, one row per distinct knowledge base question.
+
+    Questions whose vector is empty are kept as all-zero rows so that row numbers
+    always line up with the knowledge base's row ids; a zero row can never beat the threshold.
+    """
+
+    def __init__(self, matrix: np.ndarray, size: Optional[int] = None):
+        # Rows beyond `size` are spare capacity for questions taught later
+        self._rows = matrix
+        self.size = matrix.shape[0] if size is None else size
+        # Optional approximate search; None means every query scans the whole matrix
+        self.ann: Optional[IVFIndex] = None
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._rows[:self.size]
+
+    @classmethod
+    def build(cls, questions: List[str], nlp: Any) -> 'QuestionIndex':
+        return cls(embed_questions(questions, nlp))
+
+    def build_ann(self, n_lists: Optional[int] = None, n_probe: Optional[int] = None):
+        """Train an IVF index so queries only score the buckets nearest to them."""
+        self.ann = IVFIndex.train(self.matrix, n_lists=n_lists, n_probe=n_probe or ANN_PROBES)
+
+    def add(self, question: str, nlp: Any) -> int:
+        """Embed and append one question in place and return its row."""
+        return self.add_vector(embed_questions([question], nlp)[0])
+
+    def add_vector(self, vector: np.ndarray) -> int:
+        """Append one already normalised row, growing the matrix geometrically."""
+        position = self.size
+        if position == self._rows.shape[0]:
+            grown = np.zeros((max(2 * position, 16), self._rows.shape[1]), dtype=np.float32)
+            grown[:position] = self._rows
+            self._rows = grown
+
+        self._rows[position] = vector
+        self.size += 1
+        if self.ann is not None:
+            self.ann.add(position, self._rows[position])
+        return position
+
+    def has_vector(self, position: int) -> bool:
+        # A question just added to the knowledge base is findable by text a moment before its
+        # row is appended here, so a concurrent lookup can ask about a row that does not exist yet
+        return position < self.size and bool(self._rows[position].any())
+
+    def top_k(self, vector: np.ndarray, vector_norm: float, k: int) -> List[Tuple[int, float]]:
+        """Return up to `k` (row, cosine similarity) pairs, best first, from a single scoring pass."""
+        if not len(self) or k <= 0:
+            return []
+        query = vector / vector_norm
+
+        rows = None
+        if self.ann is not None:
+            candidates = self.ann.candidates(query)
+            if len(candidates):
+                rows = candidates
+        similarities = self.matrix @ query if rows is None else self.matrix[rows] @ query
+
+        if k == 1:
+            # argmax keeps the old first-row-wins tie-break, which matters for duplicate questions
+            top = np.array([np.argmax(similarities)])
+        elif k < len(similarities):
+            top = np.argpartition(-similarities, k - 1)[:k]
+            top = top[np.lexsort((top, -similarities[top]))]
+        else:
+            top = np.lexsort((np.arange(len(similarities)), -similarities))
+
+        positions = top if rows is None else rows[top]
+        return [(int(position), float(similarity)) for position, similarity in zip(positions, similarities[top])]
+
+    def best_matches(self, queries: np.ndarray) -> List[Tuple[Optional[int], float]]:
+        """Return the best (row, cosine similarity) for each L2-normalised query row, scoring them together.
+
+        Without an ANN index the batch is scored with matrix-matrix products, so the question
+        matrix is read once per batch instead of once per query.
+        """
+        if not len(self):
+            return [(None, 0.0)] * len(queries)
+        if self.ann is not None:
+            # Each query probes its own buckets, so there is no shared product to compute
+            return [self.top_k(query, 1.0, 1)[0] for query in queries]
+
+        queries = np.ascontiguousarray(queries, dtype=np.float32).T
+        best_rows = np.zeros(queries.shape[1], dtype=np.int64)
+        best_similarities = np.full(queries.shape[1], -np.inf, dtype=np.float32)
+        matrix = self.matrix
+        for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+            similarities = matrix[start:start + SCORE_BLOCK_ROWS] @ queries
+            rows = np.argmax(similarities, axis=0)
+            block_best = similarities[rows, np.arange(len(rows))]
+            # Strictly greater keeps the first-row-wins tie-break of top_k
+            better = block_best > best_similarities
+            best_rows[better] = rows[better] + start
+            best_similarities[better] = block_best[better]
+        return [(int(row), float(similarity)) for row, similarity in zip(best_rows, best_similarities)]
+
+    def best_match(self, vector: np.ndarray, vector_norm: float) -> Tuple[Optional[int], float]:
+        """Return the row with the highest cosine similarity to `vector` and its score."""
+        matches = self.top_k(vector, vector_norm, 1)
+        return matches[0] if matches else (None, 0.0)
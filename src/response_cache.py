@@ -0,0 +1,115 @@
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+RESPONSE_CACHE_SIZE = int(os.environ.get("CHATBOT_RESPONSE_CACHE_SIZE", "1024"))
+# Entries added to the index that are remembered for matches computed before they were added
+RECENT_ENTRIES = 64
+
+
+class CachedMatch(NamedTuple):
+    position: Optional[int]
+    similarity: float
+    # Normalised input vector, kept so a newly taught entry can be scored against cached inputs
+    vector: Optional[np.ndarray]
+
+
+def normalize_input(user_input: str) -> str:
+    # Only whitespace is folded: extra whitespace tokens have no vector and leave the cosine score
+    # unchanged, whereas en_core_web_md vectors are case-sensitive so case is kept
+    return ' '.join(user_input.split())
+
+
+class ResponseCache:
+    """Bounded LRU map from normalised user input to its best matching entry and score.
+
+    The raw best match is stored even when it is below the reply threshold, so that
+    repeated unknown questions also skip the pipeline. Safe to share between threads: a
+    match scored against an index that has since grown is rescored against the added
+    rows before it is stored, so it cannot hide an entry taught while it was computed.
+    """
+
+    def __init__(self, capacity: int = RESPONSE_CACHE_SIZE):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, CachedMatch]' = OrderedDict()
+        # (row, position, vector) of the most recently added index rows, and the last row forgotten
+        self._added: 'deque[Tuple[int, int, np.ndarray]]' = deque(maxlen=RECENT_ENTRIES)
+        self._forgotten_row = -1
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_input: str) -> Optional[CachedMatch]:
+        key = normalize_input(user_input)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return cached
+
+    def put(self, user_input: str, position: Optional[int], similarity: float, vector: Optional[np.ndarray] = None,
+            rows: Optional[int] = None):
+        """Store a match; `rows` is the size of the index it was scored against, read before scoring."""
+        if self.capacity <= 0:
+            return
+        key = normalize_input(user_input)
+        with self._lock:
+            if rows is not None and vector is not None:
+                if rows <= self._forgotten_row:
+                    # Rows were added since that this cache no longer holds, so the match cannot be checked
+                    return
+                for row, added_position, added_vector in self._added:
+                    if row >= rows:
+                        added_similarity = float(vector @ added_vector)
+                        if added_similarity > similarity:
+                            position, similarity = added_position, added_similarity
+            self._entries[key] = CachedMatch(position, similarity, vector)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def entry_added(self, position: int, row: np.ndarray, row_id: Optional[int] = None):
+        """Re-point cached inputs that the newly added entry now matches better than their cached match.
+
+        With `row_id`, the entry's row in the index, later `put()` calls for matches scored
+        before the row existed are checked against it too.
+        """
+        if not row.any():
+            return
+        with self._lock:
+            if row_id is not None:
+                if len(self._added) == self._added.maxlen:
+                    self._forgotten_row = self._added[0][0]
+                self._added.append((row_id, position, row))
+            cached_matches = [(key, cached) for key, cached in self._entries.items() if cached.vector is not None]
+            if not cached_matches:
+                return
+            similarities = np.stack([cached.vector for _, cached in cached_matches]) @ row
+            for (key, cached), similarity in zip(cached_matches, similarities):
+                if similarity > cached.similarity:
+                    self._entries[key] = CachedMatch(position, float(similarity), cached.vector)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size, hits, misses = len(self._entries), self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "size": size,
+            "capacity": self.capacity,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
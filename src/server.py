@@ -0,0 +1,329 @@
+import argparse
+import asyncio
+import gc
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .chat_engine import ChatEngine, ChatService
+    from .session_store import SESSION_FILE, SessionStore, SharedSessionStore
+except ImportError:
+    from chat_engine import ChatEngine, ChatService
+    from session_store import SESSION_FILE, SessionStore, SharedSessionStore
+
+SERVER_HOST = os.environ.get("CHATBOT_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("CHATBOT_PORT", "8000"))
+# Requests are matched on this many threads; connections beyond it wait in the queue
+SERVER_THREADS = int(os.environ.get("CHATBOT_SERVER_THREADS", str(os.cpu_count() or 4)))
+# Above 1, the model and index are loaded once and this many processes are forked to serve them
+SERVER_WORKERS = int(os.environ.get("CHATBOT_SERVER_WORKERS", "1"))
+# Request bodies are a question and an answer, so anything much larger is refused
+MAX_BODY_SIZE = int(os.environ.get("CHATBOT_MAX_BODY_SIZE", "65536"))
+# Seconds a connection may sit idle before its thread is given back to the pool
+REQUEST_TIMEOUT = float(os.environ.get("CHATBOT_REQUEST_TIMEOUT", "10"))
+# Callers of the operator endpoints must send this as a bearer token; empty allows only callers on this machine
+ADMIN_TOKEN = os.environ.get("CHATBOT_ADMIN_TOKEN", "")
+
+GET_ROUTES = ('/health', '/stats')
+# POST endpoint -> the JSON string fields it takes
+POST_ROUTES = {
+    '/ask': ("question",),
+    '/teach': ("question", "answer"),
+    '/reload': (),
+    '/chat': ("message",),
+}
+# The endpoints that act on the whole chatbot rather than one visitor, like the CLI's operator commands
+OPERATOR_ROUTES = ('/reload', '/stats')
+
+
+class ChatRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints: POST /ask, /teach, /reload and /chat, and GET /health and /stats."""
+
+    server: 'ChatHTTPServer'
+    server_version = "LearnBot/1.0"
+    # Every connection holds one of the pool's threads, so a client that stops sending must not keep it
+    timeout = REQUEST_TIMEOUT
+
+    def do_GET(self):
+        route = self.path.split('?', 1)[0]
+        if route not in GET_ROUTES:
+            self.send_json(404, {"error": f"Unknown endpoint '{self.path}'."})
+            return
+        if not self.check_operator(route):
+            return
+        self.send_json(200, getattr(self.server.service, route[1:])())
+
+    def do_POST(self):
+        route = self.path.split('?', 1)[0]
+        if route not in POST_ROUTES:
+            self.send_json(404, {"error": f"Unknown endpoint '{self.path}'."})
+            return
+        if not self.check_operator(route):
+            return
+
+        try:
+            body = self.read_json()
+            arguments = [self.text_field(body, name) for name in POST_ROUTES[route]]
+            if route == '/chat':
+                session_id = body.get("session_id")
+                if session_id is not None and not isinstance(session_id, str):
+                    raise ValueError("Field 'session_id' must be a string.")
+                arguments.append(session_id)
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        try:
+            # /chat is a conversation turn on the server; every other route is the ChatService method of the same name
+            target = self.server if route == '/chat' else self.server.service
+            result = getattr(target, route[1:])(*arguments)
+        except Exception as e:
+            logging.error(f"Unexpected error handling {route}: {e}")
+            self.send_json(500, {"error": "An unexpected error occurred."})
+            return
+        self.send_json(200, result)
+
+    def check_operator(self, route: str) -> bool:
+        """Refuse an operator endpoint with 403 unless the caller sends ADMIN_TOKEN, or is local when it is unset."""
+        if route not in OPERATOR_ROUTES:
+            return True
+        if ADMIN_TOKEN:
+            authorized = hmac.compare_digest(self.headers.get('Authorization', '').encode('utf-8'),
+                                             f"Bearer {ADMIN_TOKEN}".encode('utf-8'))
+        else:
+            authorized = ipaddress.ip_address(self.client_address[0]).is_loopback
+        if not authorized:
+            logging.warning(f"Refused {route} from {self.address_string()}.")
+            self.send_json(403, {"error": f"Endpoint '{route}' is for the operator only."})
+        return authorized
+
+    def read_json(self) -> Dict[str, Any]:
+        header = self.headers.get('Content-Length') or '0'
+        # A negative length would make rfile.read wait for the client to close the connection
+        if not header.strip().isdigit():
+            raise ValueError(f"Content-Length '{header}' is not a valid length.")
+        length = int(header)
+        if length > MAX_BODY_SIZE:
+            raise ValueError(f"Request body is larger than {MAX_BODY_SIZE} bytes.")
+        if not length:
+            return {}
+        try:
+            content = self.rfile.read(length)
+        except TimeoutError:
+            raise ValueError(f"Request body was not received within {REQUEST_TIMEOUT} seconds.")
+        try:
+            body = json.loads(content)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise ValueError(f"Request body is not valid JSON: {e}")
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object.")
+        return body
+
+    @staticmethod
+    def text_field(body: Dict[str, Any], name: str) -> str:
+        value = body.get(name)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"Field '{name}' must be a non-empty string.")
+        return value
+
+    def send_json(self, status: int, payload: Dict[str, Any]):
+        content = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args: Any):
+        # Access lines go to chatbot.log at debug level instead of stderr
+        logging.debug(f"{self.address_string()} - {format % args}")
+
+
+class ChatHTTPServer(HTTPServer):
+    """HTTPServer that handles connections on a fixed thread pool instead of one new thread each.
+
+    The pool bounds how many requests match at once, however many visitors connect. /chat
+    turns run on a ChatEngine whose event loop has a thread of its own, with each visitor's
+    conversation kept in `sessions` under the session id returned to them.
+    """
+
+    request_queue_size = 128
+
+    def __init__(self, server_address: Tuple[str, int], service: ChatService, threads: int = SERVER_THREADS,
+                 sessions: Optional[SessionStore] = None):
+        super().__init__(server_address, ChatRequestHandler)
+        self.service = service
+        self.sessions = sessions if sessions is not None else SessionStore()
+        # Visitors are anonymous, so they get the conversation but not the operator commands
+        self.engine = ChatEngine(service, allow_commands=False)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='chatbot-request')
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+
+    def serve_forever(self, poll_interval: float = 0.5):
+        # Started here rather than in __init__, so a pre-forked worker gets a loop thread of its own
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(target=self.loop.run_forever, name='chatbot-engine', daemon=True)
+            self._loop_thread.start()
+        super().serve_forever(poll_interval)
+
+    def chat(self, message: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+        session_id, session = self.sessions.get(session_id)
+        response = asyncio.run_coroutine_threadsafe(self.engine.process(message, session), self.loop).result()
+        if response.end_session:
+            self.sessions.discard(session_id)
+        else:
+            self.sessions.put(session_id, session)
+        return {"session_id": session_id, **response._asdict()}
+
+    def process_request(self, request: Any, client_address: Any):
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request: Any, client_address: Any):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._loop_thread.join()
+            self.loop.close()
+            self.loop = None
+        self.sessions.close()
+
+
+def serve(knowledge_base_file: str = 'knowledge_base.json', host: str = SERVER_HOST, port: int = SERVER_PORT,
+          threads: int = SERVER_THREADS, workers: int = SERVER_WORKERS):
+    if workers > 1:
+        serve_prefork(knowledge_base_file, host, port, threads, workers)
+        return
+
+    service = ChatService(knowledge_base_file)
+    server = ChatHTTPServer((host, port), service, threads, SessionStore(path=SESSION_FILE or None))
+    logging.info(f"Serving '{knowledge_base_file}' on http://{host}:{server.server_port} with {threads} threads.")
+    print(f"Serving on http://{host}:{server.server_port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("HTTP server stopped by Ray.")
+    finally:
+        server.server_close()
+        service.close()
+
+
+def serve_prefork(knowledge_base_file: str = 'knowledge_base.json', host: str = SERVER_HOST,
+                  port: int = SERVER_PORT, threads: int = SERVER_THREADS, workers: int = SERVER_WORKERS):
+    """Load the model and index once, then fork `workers` processes that accept on the same socket.
+
+    Matching holds the GIL, so one process uses about one core; forked workers scale across
+    cores while sharing the parent's read-only pages copy-on-write (and the snapshot's mapped
+    pages through the page cache), instead of each loading its own copy of the model.
+    """
+    if not hasattr(os, 'fork'):
+        raise RuntimeError("Serving with several workers needs os.fork, which this platform does not have.")
+
+    # No threads are started before the fork: a forked child only inherits the thread that forked it
+    service = ChatService(knowledge_base_file, shared=True)
+    if SESSION_FILE:
+        logging.warning("Workers share their chat sessions on disk, so CHATBOT_SESSION_FILE is ignored with several "
+                        "workers.")
+    # Any worker may accept a visitor's next message, so they all keep sessions in one store
+    sessions = SharedSessionStore(knowledge_base_file)
+    sessions.clear()
+    server = ChatHTTPServer((host, port), service, threads, sessions)
+    # Objects loaded so far are never collected, so keep the collector from writing to them and
+    # un-sharing their pages in every worker
+    gc.freeze()
+
+    children: List[int] = []
+    stopping = False
+
+    def start_worker():
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(server, service)
+        children.append(pid)
+
+    def stop(signum: int, frame: Any):
+        nonlocal stopping
+        stopping = True
+        for child in children:
+            try:
+                os.kill(child, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for _ in range(workers):
+        start_worker()
+    signal.signal(signal.SIGTERM, stop)
+    logging.info(f"Serving '{knowledge_base_file}' on http://{host}:{server.server_port} with {workers} workers "
+                 f"of {threads} threads.")
+    print(f"Serving on http://{host}:{server.server_port}", flush=True)
+    try:
+        while children:
+            pid, status = os.wait()
+            children.remove(pid)
+            if not stopping and status != 0:
+                logging.error(f"Worker {pid} exited unexpectedly ({status}), starting a new one.")
+                start_worker()
+        logging.info("HTTP server stopped.")
+    except KeyboardInterrupt:
+        # Ctrl+C reaches the whole process group, so the workers are already stopping
+        for child in children:
+            try:
+                os.waitpid(child, 0)
+            except ChildProcessError:
+                pass
+        logging.info("HTTP server stopped by Ray.")
+    finally:
+        server.socket.close()
+        sessions.clear()
+
+
+def _run_worker(server: ChatHTTPServer, service: ChatService):
+    # SIGTERM stops a worker the same way Ctrl+C does, so it shuts down cleanly
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    status = 0
+    try:
+        service.start()
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logging.critical(f"Worker {os.getpid()} stopped with an error: {e}")
+        status = 1
+    finally:
+        server.server_close()
+        service.close()
+        os._exit(status)
+
+
+def main():
+    """Serve the chatbot over HTTP, e.g. for the website front end."""
+    parser = argparse.ArgumentParser(description="Serve the chatbot's ask, teach, reload and chat endpoints over HTTP.")
+    parser.add_argument("knowledge_base_file", nargs="?", default="knowledge_base.json")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--threads", type=int, default=SERVER_THREADS)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    args = parser.parse_args()
+
+    serve(args.knowledge_base_file, args.host, args.port, args.threads, args.workers)
+
+
+if __name__ == '__main__':
+    main()
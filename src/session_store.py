@@ -0,0 +1,254 @@
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from .journal import atomic_write, sessions_lock, write_json_atomic
+except ImportError:
+    from journal import atomic_write, sessions_lock, write_json_atomic
+
+# Sessions idle for this many seconds are forgotten, and at most this many are kept
+SESSION_TTL = float(os.environ.get("CHATBOT_SESSION_TTL", "1800"))
+SESSION_CAPACITY = int(os.environ.get("CHATBOT_SESSION_CAPACITY", "100000"))
+# Exchanges kept per session as recent context
+SESSION_HISTORY = int(os.environ.get("CHATBOT_SESSION_HISTORY", "5"))
+# File sessions are saved to on shutdown and restored from on start; empty keeps them in memory only
+SESSION_FILE = os.environ.get("CHATBOT_SESSION_FILE", "")
+# Sessions shared by several workers are swept for expired ones at most this often, in seconds
+SESSION_SWEEP_INTERVAL = float(os.environ.get("CHATBOT_SESSION_SWEEP_INTERVAL", "60"))
+
+# What secrets.token_urlsafe(16) mints; any other id a client sends cannot name a session
+_SESSION_ID = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+
+def session_directory(file_path: str) -> str:
+    base, _ = os.path.splitext(file_path)
+    return f"{base}.sessions"
+
+
+class ChatSession:
+    """What one conversation carries from one message to the next."""
+
+    __slots__ = ("pending_question", "history", "last_active")
+
+    def __init__(self, pending_question: Optional[str] = None, history: Any = (), last_active: float = 0.0):
+        # The question the bot asked to be taught an answer for; the next message answers it
+        self.pending_question = pending_question
+        # Recent (message, reply) pairs, oldest first
+        self.history: 'deque[Tuple[str, str]]' = deque((tuple(exchange) for exchange in history),
+                                                       maxlen=SESSION_HISTORY)
+        self.last_active = last_active
+
+    def remember(self, message: str, reply: str):
+        self.history.append((message, reply))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"pending_question": self.pending_question, "history": [list(exchange) for exchange in self.history],
+                "last_active": self.last_active}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ChatSession':
+        return cls(data.get("pending_question"), data.get("history") or (), data.get("last_active", 0.0))
+
+
+class SessionStore:
+    """Session id -> ChatSession, evicting sessions idle for `ttl` seconds and the least recent above `capacity`.
+
+    Sessions are kept in last-used order, so a lookup and an eviction are both O(1). Ids are
+    minted here rather than taken from clients, so one visitor cannot pick up another's
+    session. With `path`, the live sessions are written there by `save()` and `close()` and
+    read back when the store is created.
+    """
+
+    def __init__(self, ttl: float = SESSION_TTL, capacity: int = SESSION_CAPACITY, path: Optional[str] = None,
+                 clock: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.capacity = capacity
+        self.path = path
+        # Wall-clock time by default, so last_active still means something after a restart
+        self.clock = clock
+        self._sessions: 'OrderedDict[str, ChatSession]' = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def get(self, session_id: Optional[str] = None) -> Tuple[str, ChatSession]:
+        """Return the session for `session_id`, or a new session and its id if it is unknown or expired."""
+        now = self.clock()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(session_id) if session_id is not None else None
+            if session is None:
+                session_id = secrets.token_urlsafe(16)
+                session = self._sessions[session_id] = ChatSession()
+                if len(self._sessions) > self.capacity:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_active = now
+            return session_id, session
+
+    def put(self, session_id: str, session: ChatSession):
+        """Store `session` again after a turn has changed it."""
+        with self._lock:
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+
+    def discard(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _evict(self, now: float):
+        # The oldest session is always first, so only expired sessions are ever looked at
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_active < self.ttl:
+                break
+            self._sessions.popitem(last=False)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            self._evict(self.clock())
+            data = {"sessions": {session_id: session.to_dict() for session_id, session in self._sessions.items()}}
+        try:
+            write_json_atomic(self.path, data)
+            logging.info(f"Saved {len(data['sessions'])} chat sessions to '{self.path}'.")
+        except Exception as e:
+            logging.error(f"Error saving chat sessions to '{self.path}': {e}")
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as file:
+                sessions = json.load(file).get("sessions", {})
+        except FileNotFoundError:
+            return
+        except (json.JSONDecodeError, AttributeError) as e:
+            logging.error(f"Error reading chat sessions from '{self.path}': {e}")
+            return
+        restored = [(session_id, ChatSession.from_dict(data)) for session_id, data in sessions.items()]
+        # Back in last-used order, keeping the most recent when there are more than the capacity
+        restored.sort(key=lambda item: item[1].last_active)
+        self._sessions.update(restored[max(0, len(restored) - self.capacity):])
+        self._evict(self.clock())
+        logging.info(f"Restored {len(self._sessions)} chat sessions from '{self.path}'.")
+
+    def close(self):
+        self.save()
+
+
+class SharedSessionStore(SessionStore):
+    """A SessionStore on disk, shared by the pre-forked workers that accept on one socket.
+
+    Any worker may receive a visitor's next message, so each session is a JSON file named by
+    its id in `session_directory(knowledge_base_file)`. `get()` reads it and `put()` writes it
+    back after the turn, under sessions_lock, with the file's modification time set to the
+    session's last use. That lets `_sweep()` find expired sessions, and the least recent above
+    `capacity`, from the directory listing alone; it runs at most every `sweep_interval`
+    seconds per worker, so between sweeps the directory can hold a few sessions more.
+    """
+
+    def __init__(self, knowledge_base_file: str, ttl: float = SESSION_TTL, capacity: int = SESSION_CAPACITY,
+                 clock: Callable[[], float] = time.time, sweep_interval: float = SESSION_SWEEP_INTERVAL):
+        super().__init__(ttl, capacity, clock=clock)
+        self.knowledge_base_file = knowledge_base_file
+        self.directory = session_directory(knowledge_base_file)
+        self.sweep_interval = sweep_interval
+        self._swept = float('-inf')
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._session_files())
+
+    def get(self, session_id: Optional[str] = None) -> Tuple[str, ChatSession]:
+        now = self.clock()
+        self._sweep(now)
+        session = None
+        if session_id is not None and _SESSION_ID.fullmatch(session_id):
+            session = self._read(session_id, now)
+        if session is None:
+            session_id, session = secrets.token_urlsafe(16), ChatSession()
+        session.last_active = now
+        return session_id, session
+
+    def put(self, session_id: str, session: ChatSession):
+        path = self._path(session_id)
+        with sessions_lock(self.knowledge_base_file):
+            # Sessions are short-lived, so a turn does not wait for the disk
+            with atomic_write(path, durable=False) as file:
+                json.dump(session.to_dict(), file)
+            os.utime(path, (session.last_active, session.last_active))
+
+    def discard(self, session_id: str):
+        with sessions_lock(self.knowledge_base_file):
+            try:
+                os.remove(self._path(session_id))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        """Forget every session, e.g. when the server starts."""
+        with sessions_lock(self.knowledge_base_file):
+            for _, path in self._session_files():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    def _read(self, session_id: str, now: float) -> Optional[ChatSession]:
+        try:
+            with sessions_lock(self.knowledge_base_file, exclusive=False):
+                with open(self._path(session_id), 'r') as file:
+                    session = ChatSession.from_dict(json.load(file))
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, AttributeError) as e:
+            logging.error(f"Error reading chat session '{session_id}': {e}")
+            return None
+        if now - session.last_active >= self.ttl:
+            return None
+        return session
+
+    def _session_files(self) -> List[Tuple[float, str]]:
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                # Skips atomic_write's temporary files, which are hidden
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+        return files
+
+    def _sweep(self, now: float):
+        if now - self._swept < self.sweep_interval:
+            return
+        self._swept = now
+        with sessions_lock(self.knowledge_base_file):
+            files = sorted(self._session_files())
+            expired = sum(1 for last_active, _ in files if now - last_active >= self.ttl)
+            for _, path in files[:max(expired, len(files) - self.capacity)]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def save(self):
+        # Every session is already on disk
+        pass
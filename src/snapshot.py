@@ -0,0 +1,327 @@
+import argparse
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from .ann_index import ANN_PROBES, IVFIndex
+    from .embedding_cache import question_hash
+    from .journal import atomic_write
+    from .knowledge_base import KnowledgeBase
+    from .question_index import QuestionIndex
+except ImportError:
+    from ann_index import ANN_PROBES, IVFIndex
+    from embedding_cache import question_hash
+    from journal import atomic_write
+    from knowledge_base import KnowledgeBase
+    from question_index import QuestionIndex
+
+# Set CHATBOT_SNAPSHOT=0 to always start from the JSON file
+SNAPSHOT_ENABLED = os.environ.get("CHATBOT_SNAPSHOT", "1") != "0"
+
+SNAPSHOT_MAGIC = b'LEARNBOT'
+SNAPSHOT_FORMAT_VERSION = 1
+# Magic, format version and header length, followed by the JSON header and the aligned sections
+_PREAMBLE = struct.Struct('<8sII')
+_ALIGNMENT = 64
+
+
+def snapshot_path(knowledge_base_file: str) -> str:
+    base, _ = os.path.splitext(knowledge_base_file)
+    return f"{base}.snapshot"
+
+
+def source_stamp(knowledge_base_file: str) -> Optional[Dict[str, int]]:
+    """Identify the current version of the JSON file, or None when it does not exist."""
+    try:
+        stat = os.stat(knowledge_base_file)
+    except FileNotFoundError:
+        return None
+    # Atomic saves replace the file, so the inode changes even if size and mtime happen to match
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "inode": stat.st_ino}
+
+
+def _question_key(question: str) -> int:
+    return int(question_hash(question), 16)
+
+
+class StringTable:
+    """Column of strings stored as UTF-8 in a snapshot and decoded on access.
+
+    Values appended after loading are kept in an ordinary list on top of the mapped data.
+    """
+
+    __slots__ = ("_offsets", "_data", "_present", "_size", "_appended")
+
+    def __init__(self, offsets: np.ndarray, data: memoryview, present: Optional[np.ndarray] = None):
+        self._offsets = offsets
+        self._data = data
+        # None for columns without missing values
+        self._present = present
+        self._size = len(offsets) - 1
+        self._appended: List[Optional[str]] = []
+
+    def __len__(self) -> int:
+        return self._size + len(self._appended)
+
+    def __getitem__(self, index: int) -> Optional[str]:
+        if index < 0:
+            index += len(self)
+        if index >= self._size:
+            return self._appended[index - self._size]
+        if self._present is not None and not self._present[index]:
+            return None
+        return str(self._data[self._offsets[index]:self._offsets[index + 1]], 'utf-8')
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def append(self, value: Optional[str]):
+        self._appended.append(value)
+
+
+class IntColumn:
+    """Column of integers mapped read-only from a snapshot.
+
+    The mapped pages stay shared between the processes that map the snapshot until an entry
+    is appended; the column is then copied into an ordinary array('q') and grows from there.
+    """
+
+    __slots__ = ("_values",)
+
+    def __init__(self, values: np.ndarray):
+        self._values: Any = values
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __getitem__(self, index: int) -> int:
+        return int(self._values[index])
+
+    def __array__(self, dtype: Any = None, copy: Any = None) -> np.ndarray:
+        return np.asarray(self._values, dtype=dtype)
+
+    def append(self, value: int):
+        if isinstance(self._values, np.ndarray):
+            self._values = array('q', self._values.tobytes())
+        self._values.append(value)
+
+
+class QuestionLookup:
+    """Question text -> row id, backed by the snapshot's sorted table of question hashes.
+
+    Hash matches are confirmed against the question text, so collisions cannot return
+    the wrong row. Rows added after loading go into an ordinary dict.
+    """
+
+    __slots__ = ("_hashes", "_hash_rows", "_questions", "_row_positions", "_added")
+
+    def __init__(self, hashes: np.ndarray, hash_rows: np.ndarray, questions: StringTable,
+                 row_positions: Sequence[int]):
+        self._hashes = hashes
+        self._hash_rows = hash_rows
+        self._questions = questions
+        self._row_positions = row_positions
+        self._added: Dict[str, int] = {}
+
+    def get(self, question: str, default: Optional[int] = None) -> Optional[int]:
+        row = self._added.get(question)
+        if row is not None:
+            return row
+        key = np.uint64(_question_key(question))
+        index = int(np.searchsorted(self._hashes, key))
+        while index < len(self._hashes) and self._hashes[index] == key:
+            row = int(self._hash_rows[index])
+            if self._questions[self._row_positions[row]] == question:
+                return row
+            index += 1
+        return default
+
+    def __setitem__(self, question: str, row: int):
+        self._added[question] = row
+
+
+def _string_sections(values: Sequence[Optional[str]]) -> Tuple[np.ndarray, bytes, np.ndarray]:
+    encoded = [value.encode('utf-8') if value is not None else b'' for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    present = np.fromiter((value is not None for value in values), dtype=np.uint8, count=len(values))
+    return offsets, b''.join(encoded), present
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def write_snapshot(knowledge_base_file: str, knowledge_base: KnowledgeBase, question_index: QuestionIndex,
+                   model: str, stamp: Dict[str, int]) -> bool:
+    """Compile the knowledge base and its vectors into one memory-mappable file.
+
+    `stamp` is the source_stamp taken before the JSON file was read, so a file changed
+    while it was being loaded simply makes the snapshot stale. Returns False, with the
+    reason logged, when the knowledge base cannot be compiled or written.
+    """
+    columns = knowledge_base.columns()
+    if len(question_index) != knowledge_base.row_count():
+        logging.warning(f"Not writing a snapshot for '{knowledge_base_file}': the index does not match the entries.")
+        return False
+    try:
+        question_offsets, question_data, _ = _string_sections(columns["questions"])
+        answer_offsets, answer_data, answer_present = _string_sections(columns["answers"])
+        row_questions = knowledge_base.row_questions()
+        keys = np.fromiter((_question_key(question) for question in row_questions), dtype=np.uint64,
+                           count=len(row_questions))
+    except (AttributeError, UnicodeError) as e:
+        logging.warning(f"Not writing a snapshot for '{knowledge_base_file}': {e}")
+        return False
+    order = np.argsort(keys, kind='stable')
+
+    sections: Dict[str, Any] = {
+        "question_offsets": question_offsets,
+        "question_data": np.frombuffer(question_data, dtype=np.uint8),
+        "answer_offsets": answer_offsets,
+        "answer_data": np.frombuffer(answer_data, dtype=np.uint8),
+        "answer_present": answer_present,
+        "rows": np.asarray(columns["rows"], dtype=np.int64),
+        "row_positions": np.asarray(columns["row_positions"], dtype=np.int64),
+        "hashes": keys[order],
+        "hash_rows": order.astype(np.int64),
+        "matrix": np.ascontiguousarray(question_index.matrix, dtype=np.float32),
+    }
+    if question_index.ann is not None:
+        lists = question_index.ann.lists
+        list_offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum([len(rows) for rows in lists], out=list_offsets[1:])
+        sections["ann_centroids"] = np.ascontiguousarray(question_index.ann.centroids, dtype=np.float32)
+        sections["ann_offsets"] = list_offsets
+        sections["ann_rows"] = np.concatenate(lists).astype(np.int64) if lists else np.zeros(0, dtype=np.int64)
+
+    layout: Dict[str, Dict[str, Any]] = {}
+    offset = 0
+    for name, section in sections.items():
+        offset = _aligned(offset)
+        layout[name] = {"offset": offset, "dtype": section.dtype.str, "shape": list(section.shape)}
+        offset += section.nbytes
+    header = json.dumps({
+        "model": model,
+        "source": stamp,
+        "entries": len(knowledge_base),
+        "sections": layout,
+        # Entry fields and top-level values are rare and small, so plain JSON is enough
+        "entry_fields": {str(position): fields for position, fields in columns["entry_fields"].items()},
+        "other_values": columns["other_values"],
+    }).encode('utf-8')
+    data_start = _aligned(_PREAMBLE.size + len(header))
+
+    path = snapshot_path(knowledge_base_file)
+    try:
+        with atomic_write(path, 'wb') as file:
+            file.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, len(header)))
+            file.write(header)
+            for name, section in sections.items():
+                file.write(b'\0' * (data_start + layout[name]["offset"] - file.tell()))
+                file.write(section.tobytes())
+    except (OSError, TypeError, ValueError) as e:
+        logging.error(f"Error writing snapshot for '{knowledge_base_file}': {e}")
+        return False
+    logging.info(f"Snapshot written for {len(knowledge_base)} entries of '{knowledge_base_file}'.")
+    return True
+
+
+def read_snapshot(knowledge_base_file: str, model: str) -> Optional[Tuple[KnowledgeBase, QuestionIndex]]:
+    """Map the compiled snapshot of a knowledge base file without parsing or copying its tables.
+
+    Every column reads straight from the mapped file; the integer columns are only copied
+    once an entry is added to them.
+
+    Returns None when there is no snapshot, it is unreadable, or it no longer matches the
+    JSON file or the model; the caller then loads the JSON file and writes a new snapshot.
+    """
+    path = snapshot_path(knowledge_base_file)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = _PREAMBLE.unpack_from(mapped, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("not a knowledge base snapshot")
+        if version != SNAPSHOT_FORMAT_VERSION:
+            logging.info(f"Snapshot for '{knowledge_base_file}' has format {version} and will be rebuilt.")
+            return None
+        header = json.loads(mapped[_PREAMBLE.size:_PREAMBLE.size + header_length])
+        if header["source"] != source_stamp(knowledge_base_file) or header["model"] != model:
+            logging.info(f"Snapshot for '{knowledge_base_file}' is stale and will be rebuilt.")
+            return None
+
+        data_start = _aligned(_PREAMBLE.size + header_length)
+
+        def section(name: str) -> np.ndarray:
+            spec = header["sections"][name]
+            count = math.prod(spec["shape"])
+            if not count:
+                return np.zeros(spec["shape"], dtype=spec["dtype"])
+            return np.frombuffer(mapped, dtype=spec["dtype"], count=count,
+                                 offset=data_start + spec["offset"]).reshape(spec["shape"])
+
+        data = memoryview(mapped)
+        question_offsets = section("question_offsets")
+        answer_offsets = section("answer_offsets")
+        questions = StringTable(question_offsets, data[data_start + header["sections"]["question_data"]["offset"]:])
+        answers = StringTable(answer_offsets, data[data_start + header["sections"]["answer_data"]["offset"]:],
+                              section("answer_present"))
+        rows = IntColumn(section("rows"))
+        row_positions = IntColumn(section("row_positions"))
+        lookup = QuestionLookup(section("hashes"), section("hash_rows"), questions, row_positions)
+        matrix = section("matrix")
+
+        ann = None
+        if "ann_centroids" in header["sections"]:
+            list_offsets = section("ann_offsets")
+            ann_rows = section("ann_rows")
+            ann = IVFIndex(section("ann_centroids"),
+                           [ann_rows[list_offsets[i]:list_offsets[i + 1]] for i in range(len(list_offsets) - 1)],
+                           ANN_PROBES)
+    except (OSError, ValueError, KeyError, TypeError, struct.error) as e:
+        logging.warning(f"Ignoring unreadable snapshot for '{knowledge_base_file}': {e}")
+        return None
+
+    if len(questions) != header["entries"] or len(row_positions) != matrix.shape[0]:
+        logging.warning(f"Ignoring inconsistent snapshot for '{knowledge_base_file}'.")
+        return None
+
+    entry_fields = {int(position): fields for position, fields in header["entry_fields"].items()}
+    knowledge_base = KnowledgeBase.from_columns(questions, answers, rows, row_positions, lookup, entry_fields,
+                                                header["other_values"])
+    question_index = QuestionIndex(matrix)
+    question_index.ann = ann
+    logging.info(f"Snapshot mapped for {len(knowledge_base)} entries of '{knowledge_base_file}'.")
+    return knowledge_base, question_index
+
+
+def main():
+    """Compile the snapshot offline, e.g. as a deployment step after editing the JSON file."""
+    try:
+        from .chatbot import init_logging, load_knowledge_base_and_index
+    except ImportError:
+        from chatbot import init_logging, load_knowledge_base_and_index
+
+    parser = argparse.ArgumentParser(description="Compile the binary snapshot for a knowledge base file.")
+    parser.add_argument("knowledge_base_file", nargs="?", default="knowledge_base.json")
+    args = parser.parse_args()
+
+    init_logging()
+    knowledge_base, _ = load_knowledge_base_and_index(args.knowledge_base_file)
+    print(f"Snapshot ready for {len(knowledge_base)} entries.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import math
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Iterator, List, NamedTuple, Tuple
+
+import numpy as np
+
+# Entries hold views into the model's vectors table, and every out-of-vocabulary token shares one zero
+# vector, so each entry costs a dict slot rather than a vector copy
+TOKEN_VECTOR_CACHE_SIZE = int(os.environ.get("CHATBOT_TOKEN_VECTOR_CACHE_SIZE", "50000"))
+
+
+class DocVector(NamedTuple):
+    """The parts of a spaCy Doc that matching reads."""
+    vector: np.ndarray
+    vector_norm: float
+
+
+class TokenVectorCache:
+    """Computes document vectors from the tokenizer and a memoised token -> vector table.
+
+    Stands in for the spaCy pipeline wherever only `doc.vector` and `doc.vector_norm` are
+    read. The arithmetic mirrors Doc.vector and Doc.vector_norm step for step, so results
+    are bit-identical to running the static-vectors pipeline.
+    """
+
+    def __init__(self, nlp: Any, capacity: int = TOKEN_VECTOR_CACHE_SIZE):
+        self.nlp = nlp
+        self.capacity = capacity
+        self._attr = nlp.vocab.vectors.attr
+        self._table = nlp.vocab.vectors
+        # Shared by every token without a vector, so it must never be written to
+        self._zeros = np.zeros((nlp.vocab.vectors_length,), dtype="f")
+        self._zeros.setflags(write=False)
+        self._vectors: 'OrderedDict[int, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def supports(nlp: Any) -> bool:
+        # Any pipeline component or non-default vectors table could change what doc.vector returns
+        vectors = nlp.vocab.vectors
+        return not nlp.pipe_names and vectors.size > 0 and getattr(vectors, "mode", "default") == "default"
+
+    @property
+    def vocab(self) -> Any:
+        return self.nlp.vocab
+
+    @property
+    def meta(self):
+        return self.nlp.meta
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def token_vectors(self, keys: List[int]) -> List[np.ndarray]:
+        with self._lock:
+            vectors = [self._vectors.get(key) for key in keys]
+        for position, (key, vector) in enumerate(zip(keys, vectors)):
+            if vector is None:
+                # The same lookup Token.vector performs, except that misses share one zero vector
+                # where vocab.get_vector would return a fresh one for each
+                vectors[position] = self.nlp.vocab.get_vector(key) if key in self._table else self._zeros
+
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._vectors[key] = vector
+                self._vectors.move_to_end(key)
+            while len(self._vectors) > self.capacity:
+                self._vectors.popitem(last=False)
+        return vectors
+
+    def _doc_vector(self, doc: Any) -> DocVector:
+        if not len(doc):
+            return DocVector(self._zeros.copy(), 0.0)
+
+        # Same as Doc.vector, sum(t.vector for t in doc) / len(doc): reducing over axis 0 adds the
+        # rows one after another, exactly like the Python sum
+        rows = self.token_vectors(doc.to_array(self._attr).tolist())
+        vector = np.add.reduce(np.stack(rows), axis=0) / len(doc)
+
+        # Same as Doc.vector_norm: float32 squares accumulated left to right in double precision
+        squares = (vector * vector).astype(np.float64)
+        norm = float(np.cumsum(squares)[-1]) if len(squares) else 0.0
+        return DocVector(vector, math.sqrt(norm) if norm != 0 else 0)
+
+    def __call__(self, text: str) -> DocVector:
+        return self._doc_vector(self.nlp.tokenizer(text))
+
+    def pipe(self, texts: Iterable[str], batch_size: int = 1000, n_process: int = 1) -> Iterator[DocVector]:
+        """Embed `texts` in order, splitting them into batches across `n_process` forked processes when above 1."""
+        if n_process <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            for doc in self.nlp.tokenizer.pipe(texts, batch_size=batch_size):
+                yield self._doc_vector(doc)
+            return
+
+        global _pool_cache
+        _pool_cache = self
+        # Forked children inherit the model and the cache, so nothing large is pickled on the way in
+        with multiprocessing.get_context('fork').Pool(n_process, initializer=_init_pool_process) as pool:
+            for vectors, norms in pool.imap(_embed_batch, _batches(texts, batch_size)):
+                for vector, norm in zip(vectors, norms.tolist()):
+                    yield DocVector(vector, norm)
+        _pool_cache = None
+
+
+# The TokenVectorCache that pool processes embed with, set just before they are forked
+_pool_cache = None
+
+
+def _init_pool_process():
+    # Another thread may have held the lock at the moment of the fork
+    _pool_cache._lock = threading.Lock()
+
+
+def _embed_batch(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    # Sent back as two arrays, which pickle far faster than one small array per text
+    docs = [_pool_cache._doc_vector(doc) for doc in _pool_cache.nlp.tokenizer.pipe(texts)]
+    return np.stack([doc.vector for doc in docs]), np.array([doc.vector_norm for doc in docs])
+
+
+def _batches(texts: Iterable[str], batch_size: int) -> Iterator[List[str]]:
+    batch: List[str] = []
+    for text in texts:
+        batch.append(text)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
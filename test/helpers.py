@@ -0,0 +1,51 @@
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+
+import numpy as np
+import spacy
+
+QUESTIONS = [
+    {"question": "contact details", "answer": "Ring us"},
+    {"question": "scaffolding hire", "answer": "Weekly rates"},
+]
+
+
+def make_nlp():
+    # A blank English pipeline with a handful of static vectors is enough to exercise the index
+    nlp = spacy.blank("en")
+    nlp.vocab.set_vector("contact", np.array([1.0, 0.0, 0.0], dtype=np.float32))
+    nlp.vocab.set_vector("details", np.array([0.8, 0.2, 0.0], dtype=np.float32))
+    nlp.vocab.set_vector("scaffolding", np.array([0.0, 1.0, 0.0], dtype=np.float32))
+    nlp.vocab.set_vector("hire", np.array([0.0, 0.7, 0.3], dtype=np.float32))
+    return nlp
+
+
+class ChatServiceTestMixin:
+    """Set-up shared by the tests that run a ChatService, for TestCase and IsolatedAsyncioTestCase alike."""
+
+    def set_up_knowledge_base(self, questions: Optional[List[Dict[str, Any]]] = None, nlp: Any = None):
+        """Write `questions` to a knowledge base in a temporary directory and patch the chatbot to use `nlp`.
+
+        Reloading, snapshots and model loading are turned off and metrics go to the temporary
+        directory. Everything is undone by the test's cleanups, after tearDown.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.knowledge_base_file = os.path.join(self.directory, 'knowledge_base.json')
+        with open(self.knowledge_base_file, 'w') as file:
+            json.dump({"questions": QUESTIONS if questions is None else questions}, file)
+
+        patches = [
+            patch('src.chatbot._embedder', make_nlp() if nlp is None else nlp),
+            patch('src.chatbot.RELOAD_INTERVAL', 0),
+            patch('src.chatbot.SNAPSHOT_ENABLED', False),
+            patch('src.chat_engine.init_chatbot'),
+            patch('src.chat_engine.METRICS_FILE', os.path.join(self.directory, 'metrics.json')),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
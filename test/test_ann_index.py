@@ -0,0 +1,55 @@
+import unittest
+
+import numpy as np
+
+from src.ann_index import IVFIndex
+from src.question_index import QuestionIndex
+
+
+def clustered_matrix(rows=4000, dim=32, clusters=40, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim))
+    matrix = centres[rng.integers(0, clusters, rows)] + 0.3 * rng.standard_normal((rows, dim))
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix.astype(np.float32)
+
+
+class TestIVFIndex(unittest.TestCase):
+    def setUp(self):
+        self.matrix = clustered_matrix()
+        self.exact = QuestionIndex(self.matrix)
+        self.approximate = QuestionIndex(self.matrix.copy())
+        self.approximate.build_ann(n_probe=4)
+        rng = np.random.default_rng(1)
+        self.queries = self.matrix[rng.integers(0, len(self.matrix), 200)] + \
+            0.05 * rng.standard_normal((200, self.matrix.shape[1])).astype(np.float32)
+
+    def test_recall_against_exact_search(self):
+        hits = 0
+        for query in self.queries:
+            norm = float(np.linalg.norm(query))
+            hits += self.approximate.best_match(query, norm)[0] == self.exact.best_match(query, norm)[0]
+        self.assertGreaterEqual(hits / len(self.queries), 0.95)
+
+    def test_probing_every_list_is_exact(self):
+        self.approximate.ann.n_probe = len(self.approximate.ann.lists)
+        for query in self.queries[:20]:
+            norm = float(np.linalg.norm(query))
+            self.assertEqual(self.approximate.best_match(query, norm), self.exact.best_match(query, norm))
+
+    def test_zero_rows_are_not_indexed(self):
+        matrix = self.matrix.copy()
+        matrix[:10] = 0.0
+        ann = IVFIndex.train(matrix)
+        indexed = np.concatenate(ann.lists)
+        self.assertEqual(len(indexed), len(matrix) - 10)
+        self.assertTrue((indexed >= 10).all())
+
+    def test_added_rows_are_searchable(self):
+        vector = self.matrix[0].copy()
+        self.approximate.ann.add(len(self.matrix), vector)
+        self.assertIn(len(self.matrix), self.approximate.ann.candidates(vector))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import threading
+import time
+import unittest
+
+from src.background_writer import BackgroundWriter
+
+
+class RecordingWrite:
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+        self.written = threading.Event()
+
+    def __call__(self, batch):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        self.batches.append(list(batch))
+        self.written.set()
+
+
+class TestBackgroundWriter(unittest.TestCase):
+    def test_flushes_when_enough_items_are_pending(self):
+        write = RecordingWrite()
+        writer = BackgroundWriter(write, interval=60, max_pending=3)
+        for item in range(3):
+            writer.submit(item)
+        self.assertTrue(write.written.wait(5))
+        writer.close()
+        self.assertEqual(write.batches, [[0, 1, 2]])
+
+    def test_flushes_after_the_interval(self):
+        write = RecordingWrite()
+        writer = BackgroundWriter(write, interval=0.05, max_pending=100)
+        writer.submit("lesson")
+        self.assertTrue(write.written.wait(5))
+        self.assertEqual(writer.pending(), 0)
+        writer.close()
+        self.assertEqual(write.batches, [["lesson"]])
+
+    def test_close_flushes_pending_items(self):
+        write = RecordingWrite()
+        writer = BackgroundWriter(write, interval=60, max_pending=100)
+        writer.submit("first")
+        writer.submit("second")
+        writer.close()
+        self.assertEqual(write.batches, [["first", "second"]])
+        with self.assertRaises(RuntimeError):
+            writer.submit("late")
+
+    def test_failed_batch_is_retried_in_order(self):
+        write = RecordingWrite(failures=1)
+        writer = BackgroundWriter(write, interval=0.05, max_pending=1)
+        with self.assertLogs(level='ERROR'):
+            writer.submit("first")
+            deadline = time.monotonic() + 5
+            while write.failures and time.monotonic() < deadline:
+                time.sleep(0.01)
+        writer.submit("second")
+        writer.close()
+        self.assertEqual([item for batch in write.batches for item in batch], ["first", "second"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.benchmark import BACKENDS, compare_results, generate_questions, make_queries, run_benchmark
+from test.helpers import make_nlp
+
+TEMPLATES = [
+    {"question": "contact details?", "answer": "Ring us"},
+    {"question": "scaffolding hire for contact", "answer": "Weekly rates"},
+]
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_generated_questions_are_distinct_and_reproducible(self):
+        questions = [entry["question"] for entry in generate_questions(TEMPLATES, 60, seed=3)]
+        self.assertEqual(len(set(questions)), 60)
+        self.assertEqual(questions[:2], ["contact details?", "scaffolding hire for contact"])
+        self.assertEqual(questions, [entry["question"] for entry in generate_questions(TEMPLATES, 60, seed=3)])
+        self.assertEqual(len(make_queries(questions, 10)), 10)
+        with self.assertRaises(ValueError):
+            list(generate_questions([{"answer": "No question"}], 5))
+
+    def test_too_few_distinct_variations_raise(self):
+        # "hi" only varies into "hi hi hi?", so five distinct questions cannot be made
+        with self.assertRaises(ValueError):
+            list(generate_questions([{"question": "hi"}], 5))
+
+    @patch('src.chatbot._embedder', make_nlp())
+    def test_results_cover_every_size_and_backend(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with patch('builtins.print'):
+            results = run_benchmark(TEMPLATES, [20, 50], queries=15, directory=directory)
+
+        self.assertEqual([result["size"] for result in results["results"]], [20, 50])
+        for result in results["results"]:
+            self.assertEqual(set(result["backends"]), set(BACKENDS))
+            self.assertGreaterEqual(result["index_build_seconds"], 0)
+            self.assertEqual(result["backends"]["find_best_match"]["count"], 15)
+            self.assertEqual(result["backends"]["ann"]["recall_at_1"], 1.0)
+        self.assertIn("exact", compare_results(results, results))
+        with self.assertRaises(ValueError):
+            run_benchmark(TEMPLATES, [20], backends=["gpu"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+import src.chatbot
+from src.chat_engine import TEACH_PROMPT, ChatEngine, ChatService, ChatSession
+from test.helpers import ChatServiceTestMixin, make_nlp
+
+
+class TestChatEngine(ChatServiceTestMixin, unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        nlp = make_nlp()
+        # Far from every question in the knowledge base, so it has to be taught
+        nlp.vocab.set_vector("opening", np.array([0.0, 0.0, 1.0], dtype=np.float32))
+        self.set_up_knowledge_base(nlp=nlp)
+        self.service = ChatService(self.knowledge_base_file, batch_window=0.001)
+        self.engine = ChatEngine(self.service)
+
+    def tearDown(self):
+        self.service.close()
+
+    async def test_answer(self):
+        response = await self.engine.process("contact", ChatSession())
+        self.assertEqual((response.text, response.kind), ("Ring us", 'answer'))
+        self.assertEqual(response.matched_question, "contact details")
+
+    async def test_teach_flow(self):
+        session = ChatSession()
+        response = await self.engine.process("opening hours", session)
+        self.assertEqual((response.text, response.kind), (TEACH_PROMPT, 'teach_prompt'))
+        self.assertEqual(session.pending_question, "opening hours")
+
+        # The next message is the answer, even when it looks like a command
+        response = await self.engine.process("quit", session)
+        self.assertEqual(response.kind, 'learned')
+        self.assertIsNone(session.pending_question)
+        self.assertEqual((await self.engine.process("opening hours", session)).text, "quit")
+
+    async def test_skip_and_commands(self):
+        session = ChatSession()
+        await self.engine.process("opening hours", session)
+        self.assertEqual((await self.engine.process("skip", session)).kind, 'skipped')
+        self.assertIsNone(session.pending_question)
+
+        self.assertEqual((await self.engine.process("reboot", session)).text, "Reboot complete.")
+        self.assertEqual((await self.engine.process("reload", session)).text, "Knowledge base reloaded.")
+        self.assertTrue((await self.engine.process("Exit", session)).end_session)
+
+    async def test_reboot_reloads_the_knowledge_base_and_keeps_the_model(self):
+        model = src.chatbot._embedder
+        session = ChatSession()
+        await self.engine.process("opening hours", session)
+        await self.engine.process("Nine to five", session)
+        with open(self.knowledge_base_file, 'w') as file:
+            json.dump({"questions": [{"question": "contact details", "answer": "Email us"}]}, file)
+
+        response = await self.engine.process("reboot", session)
+        self.assertEqual((response.text, response.kind), ("Reboot complete.", 'command'))
+        self.assertIs(src.chatbot._embedder, model)
+        self.assertEqual(list(session.history), [("reboot", "Reboot complete.")])
+        # The edited file is loaded and the taught answer is replayed from the journal on top of it
+        self.assertEqual((await self.engine.process("contact", session)).text, "Email us")
+        self.assertEqual((await self.engine.process("opening hours", session)).text, "Nine to five")
+        self.assertEqual(len(self.service.state[0]), 2)
+
+        # A pending question takes the next message as its answer, so only a direct reboot can meet one
+        session.pending_question = "opening hours"
+        await self.engine._reboot(session)
+        self.assertIsNone(session.pending_question)
+
+    async def test_sessions_are_independent(self):
+        sessions = [ChatSession() for _ in range(200)]
+        questions = ["contact", "opening hours"] * 100
+        responses = await asyncio.gather(*(self.engine.process(question, session)
+                                           for question, session in zip(questions, sessions)))
+
+        self.assertEqual({response.kind for response in responses[1::2]}, {'teach_prompt'})
+        self.assertEqual({response.text for response in responses[::2]}, {"Ring us"})
+        self.assertEqual(sum(session.pending_question is not None for session in sessions), 100)
+
+    async def test_stats_command(self):
+        await self.engine.process("contact", ChatSession())
+        response = await self.engine.process("stats", ChatSession())
+        self.assertEqual(response.kind, 'command')
+        self.assertIn("lookup", response.text)
+
+        with open(os.path.join(self.directory, 'metrics.json')) as file:
+            snapshot = json.load(file)
+        self.assertGreaterEqual(snapshot["stages"]["match"]["count"], 1)
+        self.assertGreaterEqual(snapshot["counters"]["replies_answer"], 1)
+
+    async def test_errors_become_responses(self):
+        with patch.object(self.service, 'ask', side_effect=RuntimeError("boom")):
+            response = await self.engine.process("contact", ChatSession())
+        self.assertEqual(response.kind, 'error')
+
+
+if __name__ == '__main__':
+    unittest.main()
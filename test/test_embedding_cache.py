@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from src.embedding_cache import cache_paths, load_question_index, read_cache, write_cache
+from src.question_index import QuestionIndex
+from test.helpers import make_nlp
+
+
+class CountingNlp:
+    """Wraps a pipeline and counts how many texts were embedded."""
+
+    def __init__(self, nlp):
+        self.nlp = nlp
+        self.calls = 0
+
+    def __getattr__(self, name):
+        return getattr(self.nlp, name)
+
+    def __call__(self, text):
+        self.calls += 1
+        return self.nlp(text)
+
+    def pipe(self, texts, **kwargs):
+        for text in texts:
+            self.calls += 1
+            yield self.nlp(text)
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.knowledge_base_file = os.path.join(self.directory, 'knowledge_base.json')
+        self.nlp = CountingNlp(make_nlp())
+        self.questions = ["contact details", "scaffolding hire"]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cold_start_writes_sidecar_files(self):
+        question_index = load_question_index(self.knowledge_base_file, self.questions, self.nlp)
+        self.assertEqual(self.nlp.calls, 2)
+        for path in cache_paths(self.knowledge_base_file):
+            self.assertTrue(os.path.exists(path))
+        np.testing.assert_allclose(question_index.matrix, QuestionIndex.build(self.questions, self.nlp).matrix)
+
+    def test_warm_start_embeds_nothing(self):
+        load_question_index(self.knowledge_base_file, self.questions, self.nlp)
+        self.nlp.calls = 0
+        question_index = load_question_index(self.knowledge_base_file, self.questions, self.nlp)
+        self.assertEqual(self.nlp.calls, 0)
+        self.assertEqual(len(question_index), 2)
+
+    def test_only_changed_questions_are_embedded(self):
+        load_question_index(self.knowledge_base_file, self.questions, self.nlp)
+        self.nlp.calls = 0
+        changed = ["scaffolding hire", "contact", "contact details"]
+        question_index = load_question_index(self.knowledge_base_file, changed, self.nlp)
+        self.assertEqual(self.nlp.calls, 1)
+        np.testing.assert_allclose(question_index.matrix, QuestionIndex.build(changed, self.nlp).matrix)
+
+    def test_known_vectors_are_not_embedded_again(self):
+        previous = QuestionIndex.build(["hire"], self.nlp)
+        self.nlp.calls = 0
+        known = {"hire": previous.matrix[0]}
+        question_index = load_question_index(self.knowledge_base_file, ["hire", "contact"], self.nlp,
+                                             known_vector=known.get)
+        self.assertEqual(self.nlp.calls, 1)
+        np.testing.assert_array_equal(question_index.matrix[0], previous.matrix[0])
+
+    def test_concurrent_writers_do_not_share_temporary_files(self):
+        matrix = QuestionIndex.build(self.questions, self.nlp).matrix
+        errors = []
+
+        def write():
+            for _ in range(20):
+                write_cache(self.knowledge_base_file, self.nlp, ["a", "b"], matrix)
+
+        threads = [threading.Thread(target=write) for _ in range(4)]
+        with patch('src.embedding_cache.logging.error', side_effect=errors.append):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(read_cache(self.knowledge_base_file, self.nlp)[0], ["a", "b"])
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         sorted(os.path.basename(path) for path in cache_paths(self.knowledge_base_file)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from src.file_watcher import FileWatcher
+from src.snapshot import source_stamp
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestFileWatcher(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'knowledge_base.json')
+        self.write('{"questions": []}')
+        self.rebuilds = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, text):
+        with open(self.path, 'w') as file:
+            file.write(text)
+
+    def rebuild(self):
+        self.rebuilds += 1
+        return self.rebuilds
+
+    def test_change_is_rebuilt_and_taken_once(self):
+        watcher = FileWatcher(self.path, self.rebuild, interval=0.01)
+        try:
+            self.assertIsNone(watcher.take())
+            self.write('{"questions": [{"question": "new", "answer": "entry"}]}')
+            self.assertTrue(wait_for(lambda: self.rebuilds == 1))
+            stamp, result = watcher.take()
+            self.assertEqual(stamp, source_stamp(self.path))
+            self.assertEqual(result, 1)
+            self.assertIsNone(watcher.take())
+        finally:
+            watcher.close()
+
+    def test_expected_change_is_not_rebuilt(self):
+        watcher = FileWatcher(self.path, self.rebuild, interval=0.05)
+        try:
+            before = source_stamp(self.path)
+            self.write('{"questions": [{"question": "compacted", "answer": "entry"}]}')
+            watcher.expect(before, source_stamp(self.path))
+            time.sleep(0.2)
+            self.assertEqual(self.rebuilds, 0)
+
+            watcher.invalidate()
+            self.assertTrue(wait_for(lambda: self.rebuilds == 1))
+        finally:
+            watcher.close()
+
+    def test_failed_rebuild_is_logged(self):
+        def rebuild():
+            raise ValueError("bad JSON")
+
+        watcher = FileWatcher(self.path, rebuild, interval=0.01)
+        try:
+            with self.assertLogs(level='ERROR'):
+                self.write('{ invalid json }')
+                time.sleep(0.2)
+            self.assertIsNone(watcher.take())
+        finally:
+            watcher.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
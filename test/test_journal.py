@@ -0,0 +1,147 @@
+import json
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import src.chatbot as chatbot
+from src.journal import JournalFollower, journal_lock, journal_path
+from src.knowledge_base import KnowledgeBase
+
+
+class TestKnowledgeBaseJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.knowledge_base_file = os.path.join(self.directory, 'knowledge_base.json')
+        with open(self.knowledge_base_file, 'w') as file:
+            json.dump({"questions": [{"question": "What are your contact details please", "answer": "Phone"}]}, file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def teach(self, knowledge_base, question, answer):
+        position = knowledge_base.add(question, answer)
+        chatbot.append_to_knowledge_base(self.knowledge_base_file, [knowledge_base.entry(position)])
+
+    def test_lessons_are_appended_and_replayed(self):
+        knowledge_base = KnowledgeBase(chatbot.load_knowledge_base(self.knowledge_base_file))
+        self.teach(knowledge_base, "How do I reset my password?", "You can reset your password by...")
+
+        with open(self.knowledge_base_file) as file:
+            self.assertEqual(len(json.load(file)["questions"]), 1)
+        reloaded = KnowledgeBase(chatbot.load_knowledge_base(self.knowledge_base_file))
+        self.assertEqual(reloaded.questions(), knowledge_base.questions())
+
+    @patch('src.chatbot.JOURNAL_COMPACT_EVERY', 2)
+    def test_journal_is_compacted_into_snapshot(self):
+        knowledge_base = KnowledgeBase(chatbot.load_knowledge_base(self.knowledge_base_file))
+        self.teach(knowledge_base, "first", "1")
+        self.assertTrue(os.path.exists(journal_path(self.knowledge_base_file)))
+        self.teach(knowledge_base, "second", "2")
+
+        self.assertFalse(os.path.exists(journal_path(self.knowledge_base_file)))
+        with open(self.knowledge_base_file) as file:
+            self.assertEqual(len(json.load(file)["questions"]), 3)
+        self.assertEqual(os.listdir(self.directory), ['knowledge_base.json'])
+
+    @patch('src.chatbot.JOURNAL_COMPACT_EVERY', 2)
+    def test_crash_before_the_journal_is_cleared_replays_nothing_twice(self):
+        knowledge_base = KnowledgeBase(chatbot.load_knowledge_base(self.knowledge_base_file))
+        self.teach(knowledge_base, "a", "1")
+        # The snapshot is renamed into place, then the process dies before removing the journal
+        with patch('src.journal.clear_journal', side_effect=OSError("crashed")):
+            self.teach(knowledge_base, "b", "2")
+        self.assertTrue(os.path.exists(journal_path(self.knowledge_base_file)))
+
+        expected = ["What are your contact details please", "a", "b"]
+        reloaded = KnowledgeBase(chatbot.load_knowledge_base(self.knowledge_base_file))
+        self.assertEqual(reloaded.questions(), expected)
+        follower = JournalFollower(self.knowledge_base_file, reloaded.other_value("folded_journal"))
+        self.assertEqual(follower.read_new(), [])
+
+        # Lessons taught after the restart are still replayed, and the next compaction folds only them
+        with patch('src.chatbot.JOURNAL_COMPACT_EVERY', 10):
+            self.teach(reloaded, "c", "3")
+        self.assertEqual(follower.read_new(), [{"question": "c", "answer": "3"}])
+        self.assertEqual(KnowledgeBase(chatbot.load_knowledge_base(self.knowledge_base_file)).questions(),
+                         expected + ["c"])
+        chatbot.compact_journal(self.knowledge_base_file)
+        with open(self.knowledge_base_file) as file:
+            self.assertEqual([entry["question"] for entry in json.load(file)["questions"]], expected + ["c"])
+        self.assertFalse(os.path.exists(journal_path(self.knowledge_base_file)))
+
+    def test_crash_after_a_full_save_replays_nothing_twice(self):
+        knowledge_base = KnowledgeBase(chatbot.load_knowledge_base(self.knowledge_base_file))
+        self.teach(knowledge_base, "a", "1")
+        with patch('src.chatbot.clear_journal', side_effect=OSError("crashed")):
+            chatbot.save_knowledge_base(self.knowledge_base_file, knowledge_base.to_dict())
+        reloaded = KnowledgeBase(chatbot.load_knowledge_base(self.knowledge_base_file))
+        self.assertEqual(reloaded.questions(), ["What are your contact details please", "a"])
+
+    def test_torn_final_line_is_skipped(self):
+        knowledge_base = KnowledgeBase(chatbot.load_knowledge_base(self.knowledge_base_file))
+        self.teach(knowledge_base, "complete", "entry")
+        with open(journal_path(self.knowledge_base_file), 'a') as journal:
+            journal.write('{"question": "torn')
+        reloaded = KnowledgeBase(chatbot.load_knowledge_base(self.knowledge_base_file))
+        self.assertEqual(reloaded.questions(), ["What are your contact details please", "complete"])
+
+    def test_append_after_a_torn_line_keeps_every_lesson(self):
+        knowledge_base = KnowledgeBase(chatbot.load_knowledge_base(self.knowledge_base_file))
+        follower = JournalFollower(self.knowledge_base_file)
+        self.teach(knowledge_base, "a", "1")
+        self.assertEqual(len(follower.read_new()), 1)
+        # A writer that crashed mid-append leaves a line without its newline
+        with open(journal_path(self.knowledge_base_file), 'a') as journal:
+            journal.write('{"question": "b", "ans')
+        self.assertEqual(follower.read_new(), [])
+        self.teach(knowledge_base, "c", "3")
+
+        self.assertEqual([entry["question"] for entry in chatbot.read_journal(self.knowledge_base_file)], ["a", "c"])
+        self.assertEqual(follower.read_new(), [{"question": "c", "answer": "3"}])
+
+    @unittest.skipIf(os.name == 'nt', "POSIX permissions")
+    @patch('src.chatbot.JOURNAL_COMPACT_EVERY', 1)
+    def test_compaction_keeps_the_file_mode(self):
+        os.chmod(self.knowledge_base_file, 0o644)
+        knowledge_base = KnowledgeBase(chatbot.load_knowledge_base(self.knowledge_base_file))
+        self.teach(knowledge_base, "first", "1")
+        self.assertFalse(os.path.exists(journal_path(self.knowledge_base_file)))
+        self.assertEqual(stat.S_IMODE(os.stat(self.knowledge_base_file).st_mode), 0o644)
+
+    def test_journal_is_replayed_without_a_snapshot(self):
+        os.remove(self.knowledge_base_file)
+        knowledge_base = KnowledgeBase(chatbot.load_knowledge_base(self.knowledge_base_file))
+        self.teach(knowledge_base, "first lesson", "answer")
+        reloaded = KnowledgeBase(chatbot.load_knowledge_base(self.knowledge_base_file))
+        self.assertEqual(reloaded.questions(), ["first lesson"])
+
+    @patch('src.chatbot.JOURNAL_COMPACT_EVERY', 3)
+    def test_follower_reads_each_entry_once(self):
+        follower = JournalFollower(self.knowledge_base_file)
+        knowledge_base = KnowledgeBase(chatbot.load_knowledge_base(self.knowledge_base_file))
+        self.assertEqual(follower.read_new(), [])
+
+        self.teach(knowledge_base, "first", "1")
+        with open(journal_path(self.knowledge_base_file), 'a') as journal:
+            journal.write('{"question": "torn')
+        self.assertEqual(follower.read_new(), [{"question": "first", "answer": "1"}])
+        self.assertEqual(follower.read_new(), [])
+        with open(journal_path(self.knowledge_base_file), 'a') as journal:
+            journal.write('", "answer": "finished"}\n')
+        self.assertEqual(follower.read_new(), [{"question": "torn", "answer": "finished"}])
+
+        # Compacting moves everything into the JSON file; only later entries are read from the new journal
+        with journal_lock(self.knowledge_base_file):
+            self.teach(knowledge_base, "second", "2")
+            self.teach(knowledge_base, "third", "3")
+        self.assertEqual(follower.read_new(), [{"question": "third", "answer": "3"}])
+
+        follower.restart()
+        self.assertEqual(follower.read_new(), [{"question": "third", "answer": "3"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
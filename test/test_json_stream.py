@@ -0,0 +1,64 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.json_stream import iter_questions
+
+
+class TestIterQuestions(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.directory, 'knowledge_base.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, text):
+        with open(self.file_path, 'w') as file:
+            file.write(text)
+
+    def test_matches_json_load_at_any_chunk_size(self):
+        data = {
+            "version": 12.75,
+            "questions": [
+                {"question": "What are your \"contact\" details?", "answer": "Ring us é \\ ok", "score": -3.25e+2},
+                {"question": "Do you hire scaffolding?", "answer": None, "tags": [1, 22, True]},
+            ],
+            "meta": {"source": ["export"]},
+        }
+        for indent in (None, 2):
+            self.write(json.dumps(data, indent=indent, ensure_ascii=False))
+            for chunk_size in (1, 3, 7, 65536):
+                other_values = {}
+                entries = list(iter_questions(self.file_path, other_values, chunk_size=chunk_size))
+                self.assertEqual(entries, data["questions"])
+                self.assertEqual(other_values, {"version": 12.75, "meta": {"source": ["export"]}})
+
+    def test_repository_knowledge_base(self):
+        knowledge_base_file = os.path.join(os.path.dirname(__file__), '..', 'data', 'knowledge_base.json')
+        with open(knowledge_base_file) as file:
+            expected = json.load(file)["questions"]
+        self.assertEqual(list(iter_questions(knowledge_base_file, chunk_size=100)), expected)
+
+    def test_empty_and_missing_questions(self):
+        for text in ('{}', '{"questions": []}', ' { "version": 1 } '):
+            self.write(text)
+            self.assertEqual(list(iter_questions(self.file_path)), [])
+
+    def test_malformed_json_raises(self):
+        for text in ('', '{ invalid json }', '{"questions": [{"question": "a"},]}', '{"questions": [1] ',
+                     '{"questions": []} extra', '{"questions": [{"question": "unterminated'):
+            self.write(text)
+            for chunk_size in (1, 4, 65536):
+                with self.assertRaises(json.JSONDecodeError):
+                    list(iter_questions(self.file_path, chunk_size=chunk_size))
+
+    def test_missing_file_raises(self):
+        with self.assertRaises(FileNotFoundError):
+            list(iter_questions(self.file_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import unittest
+
+from src.json_stream import iter_questions
+from src.knowledge_base import KnowledgeBase
+
+
+class TestKnowledgeBase(unittest.TestCase):
+    def setUp(self):
+        self.knowledge_base = KnowledgeBase({
+            "questions": [
+                {"question": "What are your contact details please", "answer": "Phone: 07972 612 395"},
+                {"question": "Do you offer scaffolding hire?", "answer": "Yes"},
+                {"question": "What are your contact details please", "answer": "Duplicate entry"}
+            ]
+        })
+
+    def test_find_returns_first_entry_for_duplicate_text(self):
+        position = self.knowledge_base.find("What are your contact details please")
+        self.assertEqual(position, 0)
+        self.assertEqual(self.knowledge_base.answer(position), "Phone: 07972 612 395")
+
+    def test_add_updates_hash_index(self):
+        position = self.knowledge_base.add("How do I reset my password?", "You can reset your password by...")
+        self.assertEqual(position, 3)
+        self.assertEqual(self.knowledge_base.find("How do I reset my password?"), 3)
+        self.assertEqual(self.knowledge_base.to_dict()["questions"][3]["answer"], "You can reset your password by...")
+
+    def test_duplicate_text_shares_a_vector_row(self):
+        self.assertEqual(self.knowledge_base.row_count(), 2)
+        self.assertEqual(self.knowledge_base.row_questions(),
+                         ["What are your contact details please", "Do you offer scaffolding hire?"])
+        self.assertEqual(self.knowledge_base.row(2), self.knowledge_base.row(0))
+        self.assertEqual(self.knowledge_base.row_position(self.knowledge_base.row(2)), 0)
+
+        position = self.knowledge_base.add("Do you offer scaffolding hire?", "Still yes")
+        self.assertEqual(self.knowledge_base.row(position), 1)
+        position = self.knowledge_base.add("Is there a minimum hire period?", "One week")
+        self.assertEqual(self.knowledge_base.row(position), 2)
+        self.assertEqual(self.knowledge_base.row_count(), 3)
+
+    def test_to_dict_round_trips_other_fields(self):
+        data = {
+            "version": 2,
+            "questions": [
+                {"question": "Do you offer scaffolding hire?", "answer": "Yes", "tags": ["hire"]},
+                {"question": "Where are you based?", "answer": None}
+            ]
+        }
+        self.assertEqual(KnowledgeBase(data).to_dict(), data)
+
+    def test_from_entries_matches_a_loaded_dict(self):
+        data = {
+            "version": 2,
+            "questions": [
+                {"question": "Do you offer scaffolding hire?", "answer": "Yes", "tags": ["hire"]},
+                {"question": "Do you offer scaffolding hire?", "answer": "Duplicate entry"}
+            ],
+            "meta": {"source": "export"}
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'knowledge_base.json')
+            with open(file_path, 'w') as file:
+                json.dump(data, file)
+            other_values = {}
+            # "meta" comes after the questions, so it is only read once the entries are consumed
+            knowledge_base = KnowledgeBase.from_entries(iter_questions(file_path, other_values), other_values)
+
+        self.assertEqual(knowledge_base.to_dict(), data)
+        self.assertEqual(knowledge_base.row_count(), 1)
+        self.assertEqual(knowledge_base.find("Do you offer scaffolding hire?"), 0)
+
+    def test_empty_knowledge_base(self):
+        knowledge_base = KnowledgeBase({})
+        self.assertEqual(len(knowledge_base), 0)
+        self.assertIsNone(knowledge_base.find("anything"))
+        self.assertEqual(knowledge_base.to_dict(), {"questions": []})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.metrics import LatencyHistogram, Metrics
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles_are_within_a_bucket(self):
+        histogram = LatencyHistogram()
+        # 1ms to 100ms in even steps
+        for step in range(1, 101):
+            histogram.record(step / 1000)
+
+        self.assertEqual(histogram.count, 100)
+        for fraction, expected in ((0.50, 0.050), (0.95, 0.095), (0.99, 0.099)):
+            self.assertGreaterEqual(histogram.percentile(fraction), expected)
+            self.assertLessEqual(histogram.percentile(fraction), expected * 1.1)
+        self.assertEqual(histogram.percentile(1.0), 0.1)
+
+    def test_extremes(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.percentile(0.5), 0.0)
+        histogram.record(0.0)
+        histogram.record(1e9)
+        self.assertEqual(histogram.percentile(0.5), 1e-6)
+        self.assertEqual(histogram.percentile(0.99), 1e9)
+
+
+class TestMetrics(unittest.TestCase):
+    def test_timers_counters_and_file(self):
+        metrics = Metrics()
+        for _ in range(3):
+            with metrics.timer("embed"):
+                pass
+        metrics.observe("similarity", 0.002)
+        metrics.increment("batches")
+        metrics.increment("batched_queries", 5)
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["stages"]["embed"]["count"], 3)
+        self.assertAlmostEqual(snapshot["stages"]["similarity"]["p99_ms"], 2.0)
+        self.assertEqual(snapshot["counters"], {"batched_queries": 5, "batches": 1})
+        self.assertIn("similarity", metrics.format())
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'metrics.json')
+        self.assertEqual(metrics.write(path), path)
+        with open(path) as file:
+            self.assertEqual(json.load(file)["counters"]["batches"], 1)
+        self.assertIsNone(metrics.write(""))
+
+        metrics.reset()
+        self.assertEqual(metrics.snapshot()["stages"], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import threading
+import unittest
+
+from src.query_batcher import QueryBatcher
+from src.question_index import QuestionIndex
+from test.helpers import make_nlp
+
+
+class TestQueryBatcher(unittest.TestCase):
+    def setUp(self):
+        self.nlp = make_nlp()
+        self.index = QuestionIndex.build(["contact details", "scaffolding hire", "unknown words"], self.nlp)
+
+    def test_concurrent_queries_are_matched_in_one_batch(self):
+        pipe_calls = []
+
+        class CountingEmbedder:
+            def pipe(embedder, texts):
+                pipe_calls.append(texts)
+                return self.nlp.pipe(texts)
+
+        batcher = QueryBatcher(CountingEmbedder(), window=0.5, max_batch=4)
+
+        inputs = ["contact", "hire", "scaffolding", "contact details"]
+        futures = [None] * len(inputs)
+
+        def submit(position):
+            futures[position] = batcher.submit(inputs[position], self.index)
+
+        threads = [threading.Thread(target=submit, args=(position,)) for position in range(len(inputs))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results = [future.result(timeout=5) for future in futures]
+        batcher.close()
+
+        # A full batch is matched straight away rather than after the window
+        self.assertEqual(len(pipe_calls), 1)
+        for user_input, result in zip(inputs, results):
+            user_doc = self.nlp(user_input)
+            row, similarity = self.index.best_match(user_doc.vector, user_doc.vector_norm)
+            self.assertEqual(result.row, row)
+            self.assertAlmostEqual(result.similarity, similarity, places=5)
+
+    def test_empty_vector_and_separate_indexes(self):
+        other_index = QuestionIndex.build(["hire"], self.nlp)
+        batcher = QueryBatcher(self.nlp, window=0.01)
+        empty = batcher.submit("nothing known", self.index)
+        first = batcher.submit("hire", self.index)
+        second = batcher.submit("hire", other_index)
+
+        self.assertEqual(empty.result(timeout=5)[:2], (None, 0.0))
+        self.assertIsNone(empty.result().vector)
+        self.assertEqual(first.result(timeout=5).row, 1)
+        self.assertEqual(second.result(timeout=5).row, 0)
+        batcher.close()
+
+    def test_close_matches_pending_queries(self):
+        batcher = QueryBatcher(self.nlp, window=60)
+        future = batcher.submit("contact", self.index)
+        batcher.close()
+        self.assertEqual(future.result(timeout=0).row, 0)
+        with self.assertRaises(RuntimeError):
+            batcher.submit("contact", self.index)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from src.chatbot import find_top_matches
+from src.knowledge_base import KnowledgeBase
+from src.question_index import QuestionIndex
+from test.helpers import make_nlp
+
+
+class TestQuestionIndex(unittest.TestCase):
+    def setUp(self):
+        self.nlp = make_nlp()
+        self.questions = ["contact details", "scaffolding hire", "unknown words"]
+        self.index = QuestionIndex.build(self.questions, self.nlp)
+
+    def test_rows_are_normalised(self):
+        norms = np.linalg.norm(self.index.matrix, axis=1)
+        self.assertAlmostEqual(float(norms[0]), 1.0, places=6)
+        self.assertAlmostEqual(float(norms[1]), 1.0, places=6)
+        self.assertFalse(self.index.has_vector(2))
+
+    def test_rows_not_added_yet_have_no_vector(self):
+        self.assertFalse(self.index.has_vector(len(self.index)))
+        self.index.add("contact", self.nlp)
+        self.assertTrue(self.index.has_vector(3))
+
+    def test_best_match_agrees_with_spacy_similarity(self):
+        user_doc = self.nlp("scaffolding")
+        position, similarity = self.index.best_match(user_doc.vector, user_doc.vector_norm)
+        self.assertEqual(position, 1)
+        self.assertAlmostEqual(similarity, user_doc.similarity(self.nlp("scaffolding hire")), places=6)
+
+    def test_top_k_is_sorted_and_matches_full_sort(self):
+        user_doc = self.nlp("contact hire")
+        matches = self.index.top_k(user_doc.vector, user_doc.vector_norm, 2)
+        similarities = self.index.matrix @ (user_doc.vector / user_doc.vector_norm)
+        expected = [int(position) for position in np.argsort(-similarities)[:2]]
+        self.assertEqual([position for position, _ in matches], expected)
+        self.assertGreaterEqual(matches[0][1], matches[1][1])
+        self.assertEqual(len(self.index.top_k(user_doc.vector, user_doc.vector_norm, 10)), 3)
+
+    def test_add_matches_full_rebuild(self):
+        for question in ["hire details", "contact", "more unknown words"]:
+            self.index.add(question, self.nlp)
+            self.questions.append(question)
+        rebuilt = QuestionIndex.build(self.questions, self.nlp)
+        self.assertEqual(len(self.index), len(rebuilt))
+        np.testing.assert_allclose(self.index.matrix, rebuilt.matrix)
+
+    def test_best_matches_agrees_with_top_k(self):
+        rng = np.random.default_rng(0)
+        index = QuestionIndex(rng.standard_normal((50, 3)).astype(np.float32))
+        queries = rng.standard_normal((7, 3)).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        expected = [index.top_k(query, 1.0, 1)[0] for query in queries]
+
+        with patch('src.question_index.SCORE_BLOCK_ROWS', 8):
+            matches = index.best_matches(queries)
+        self.assertEqual([row for row, _ in matches], [row for row, _ in expected])
+        np.testing.assert_allclose([similarity for _, similarity in matches],
+                                   [similarity for _, similarity in expected], rtol=1e-5)
+
+    def test_empty_index(self):
+        index = QuestionIndex.build([], self.nlp)
+        user_doc = self.nlp("contact")
+        self.assertEqual(index.best_match(user_doc.vector, user_doc.vector_norm), (None, 0.0))
+
+
+@patch('src.chatbot._embedder', make_nlp())
+class TestFindTopMatches(unittest.TestCase):
+    def setUp(self):
+        # "contact zzz" has the same direction as "contact", as the unknown word has no vector
+        self.knowledge_base = KnowledgeBase({"questions": [
+            {"question": "contact", "answer": "Ring us"},
+            {"question": "scaffolding hire", "answer": "Weekly rates"},
+            {"question": "contact details", "answer": "Phone and email"},
+            {"question": "contact zzz", "answer": "Same vector as contact"},
+        ]})
+        self.index = QuestionIndex.build(self.knowledge_base.row_questions(), make_nlp())
+
+    def test_matches_are_entry_positions_best_first(self):
+        matches = find_top_matches("contact hire", self.knowledge_base, self.index, k=4)
+        self.assertEqual(len(matches), 4)
+        self.assertEqual([similarity for _, similarity in matches],
+                         sorted((similarity for _, similarity in matches), reverse=True))
+        self.assertEqual(len(find_top_matches("contact hire", self.knowledge_base, self.index, k=2)), 2)
+
+    def test_identical_text_is_pinned_first_at_one(self):
+        for question, position in (("contact zzz", 3), ("contact", 0)):
+            matches = find_top_matches(question, self.knowledge_base, self.index, k=3)
+            self.assertEqual(matches[0], (position, 1.0))
+            self.assertEqual(len(matches), 3)
+
+    def test_empty_vector_has_no_matches(self):
+        self.assertEqual(find_top_matches("zzz", self.knowledge_base, self.index), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from src.response_cache import ResponseCache, normalize_input
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_normalisation_folds_whitespace_only(self):
+        self.assertEqual(normalize_input("  What are   your contact details "), "What are your contact details")
+        self.assertNotEqual(normalize_input("What"), normalize_input("what"))
+
+    def test_hits_misses_and_lru_eviction(self):
+        cache = ResponseCache(capacity=2)
+        self.assertIsNone(cache.get("first"))
+        cache.put("first", 0, 0.9)
+        cache.put("second", 1, 0.8)
+        self.assertEqual(cache.get("first  ").position, 0)
+        cache.put("third", 2, 0.7)
+        self.assertIsNone(cache.get("second"))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 2)
+        self.assertEqual(len(cache), 2)
+
+    def test_entry_added_repoints_better_matches(self):
+        cache = ResponseCache()
+        cache.put("close to new entry", None, 0.2, np.array([1.0, 0.0], dtype=np.float32))
+        cache.put("far from new entry", 0, 0.9, np.array([0.0, 1.0], dtype=np.float32))
+        cache.entry_added(5, np.array([1.0, 0.0], dtype=np.float32))
+        self.assertEqual(cache.get("close to new entry").position, 5)
+        self.assertEqual(cache.get("far from new entry").position, 0)
+
+    def test_match_scored_before_an_entry_was_added_is_rescored(self):
+        cache = ResponseCache()
+        close, far = np.array([1.0, 0.0], dtype=np.float32), np.array([0.0, 1.0], dtype=np.float32)
+        # Both inputs were scored against an index of 3 rows, then row 3 was taught before they were stored
+        cache.entry_added(7, close, 3)
+        cache.put("close to new entry", 0, 0.2, close, rows=3)
+        cache.put("far from new entry", 0, 0.9, far, rows=3)
+        cache.put("scored after it", 1, 0.5, close, rows=4)
+        self.assertEqual(cache.get("close to new entry")[:2], (7, 1.0))
+        self.assertEqual(cache.get("far from new entry").position, 0)
+        self.assertEqual(cache.get("scored after it").position, 1)
+
+    @patch('src.response_cache.RECENT_ENTRIES', 2)
+    def test_match_older_than_the_remembered_entries_is_not_cached(self):
+        cache = ResponseCache()
+        for row in range(3, 6):
+            cache.entry_added(row, np.array([0.0, 1.0], dtype=np.float32), row)
+        cache.put("too old", 0, 0.9, np.array([1.0, 0.0], dtype=np.float32), rows=3)
+        cache.put("recent enough", 0, 0.9, np.array([1.0, 0.0], dtype=np.float32), rows=4)
+        self.assertIsNone(cache.get("too old"))
+        self.assertEqual(cache.get("recent enough").position, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+import ipaddress
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import numpy as np
+
+import src.chatbot
+from src.chat_engine import ChatService
+from src.server import ChatHTTPServer, ChatRequestHandler
+from test.helpers import ChatServiceTestMixin
+
+
+class TestServer(ChatServiceTestMixin, unittest.TestCase):
+    def setUp(self):
+        self.set_up_knowledge_base()
+        self.service = ChatService(self.knowledge_base_file)
+        self.server = ChatHTTPServer(('127.0.0.1', 0), self.service, threads=4)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        self.service.close()
+
+    def request(self, path, payload=None, headers=None):
+        url = f"http://127.0.0.1:{self.server.server_port}{path}"
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, data=data, headers=headers or {})) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_ask(self):
+        status, body = self.request('/ask', {"question": "contact"})
+        self.assertEqual(status, 200)
+        self.assertEqual(body["answer"], "Ring us")
+        self.assertEqual(body["matched_question"], "contact details")
+
+        status, body = self.request('/ask', {"question": "unknown words"})
+        self.assertEqual(status, 200)
+        self.assertIsNone(body["answer"])
+        self.assertTrue(body["needs_answer"])
+
+    def test_teach_then_ask_and_reload(self):
+        status, body = self.request('/teach', {"question": "hire", "answer": "From Monday"})
+        self.assertEqual((status, body), (200, {"learned": True, "questions": 3}))
+        self.assertEqual(self.request('/ask', {"question": "hire"})[1]["answer"], "From Monday")
+
+        # The taught answer is flushed to the journal and replayed by the reload
+        status, body = self.request('/reload', {})
+        self.assertEqual((status, body), (200, {"reloaded": True, "questions": 3}))
+        self.assertEqual(self.request('/ask', {"question": "hire"})[1]["answer"], "From Monday")
+
+    def test_concurrent_asks(self):
+        questions = ["contact", "scaffolding", "contact details", "hire"] * 10
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            answers = list(executor.map(lambda question: self.request('/ask', {"question": question})[1]["answer"],
+                                        questions))
+        self.assertEqual(answers, ["Ring us", "Weekly rates", "Ring us", "Weekly rates"] * 10)
+
+    def test_chat_sessions(self):
+        # Far from every question, so it has to be taught
+        src.chatbot._embedder.vocab.set_vector("opening", np.array([0.0, 0.0, 1.0], dtype=np.float32))
+        status, body = self.request('/chat', {"message": "opening hours"})
+        self.assertEqual((status, body["kind"]), (200, 'teach_prompt'))
+        session_id = body["session_id"]
+
+        # Another visitor's conversation does not see the pending question
+        self.assertEqual(self.request('/chat', {"message": "contact"})[1]["text"], "Ring us")
+
+        body = self.request('/chat', {"message": "Nine to five", "session_id": session_id})[1]
+        self.assertEqual((body["session_id"], body["kind"]), (session_id, 'learned'))
+        self.assertEqual(self.request('/ask', {"question": "opening hours"})[1]["answer"], "Nine to five")
+
+        # Operator commands are asked like any other question
+        body = self.request('/chat', {"message": "clear log", "session_id": session_id})[1]
+        self.assertEqual(body["kind"], 'teach_prompt')
+        self.request('/chat', {"message": "skip", "session_id": session_id})
+
+        body = self.request('/chat', {"message": "quit", "session_id": session_id})[1]
+        self.assertTrue(body["end_session"])
+        self.assertNotIn(session_id, self.server.sessions._sessions)
+        self.assertEqual(self.request('/chat', {"message": "hi", "session_id": 5})[0], 400)
+
+    def test_operator_endpoints(self):
+        with patch('src.server.ADMIN_TOKEN', 'secret'):
+            self.assertEqual(self.request('/reload', {})[0], 403)
+            self.assertEqual(self.request('/stats', headers={"Authorization": "Bearer wrong"})[0], 403)
+            status, body = self.request('/reload', {}, {"Authorization": "Bearer secret"})
+            self.assertEqual((status, body["reloaded"]), (200, True))
+            self.assertEqual(self.request('/ask', {"question": "contact"})[0], 200)
+
+        # Without a token, only callers on this machine are let in
+        with patch('src.server.ipaddress.ip_address', return_value=ipaddress.ip_address('203.0.113.7')):
+            self.assertEqual(self.request('/reload', {})[0], 403)
+            self.assertEqual(self.request('/health')[0], 200)
+        self.assertEqual(self.request('/reload', {})[0], 200)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.request('/ask', {"text": "contact"})[0], 400)
+        self.assertEqual(self.request('/ask', ["contact"])[0], 400)
+        self.assertEqual(self.request('/unknown', {})[0], 404)
+        status, body = self.request('/health')
+        self.assertEqual((status, body["questions"]), (200, 2))
+        self.request('/ask', {"question": "contact"})
+        status, body = self.request('/stats')
+        self.assertEqual(status, 200)
+        self.assertGreaterEqual(body["counters"]["questions_asked"], 1)
+
+    def connect(self, request=b''):
+        connection = socket.create_connection(('127.0.0.1', self.server.server_port))
+        self.addCleanup(connection.close)
+        connection.sendall(request)
+        return connection
+
+    def test_bad_lengths_and_idle_connections_do_not_hold_threads(self):
+        for length in (b'-1', b'ten'):
+            connection = self.connect(b'POST /ask HTTP/1.1\r\nContent-Length: ' + length + b'\r\n\r\n')
+            connection.settimeout(5)
+            self.assertIn(b' 400 ', connection.recv(4096).split(b'\r\n', 1)[0])
+
+        # More idle connections than the pool has threads, one of them stuck in the middle of a body
+        with patch.object(ChatRequestHandler, 'timeout', 0.5):
+            self.connect(b'POST /ask HTTP/1.1\r\nContent-Length: 20\r\n\r\n{')
+            for _ in range(4):
+                self.connect()
+            self.assertEqual(self.request('/ask', {"question": "contact"})[1]["answer"], "Ring us")
+
+
+class TestSharedWorkers(ChatServiceTestMixin, unittest.TestCase):
+    """Two shared services over one file stand in for two pre-forked workers."""
+
+    def setUp(self):
+        self.set_up_knowledge_base([{"question": "contact details", "answer": "Ring us"}])
+        self.workers = [ChatService(self.knowledge_base_file, shared=True) for _ in range(2)]
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.close()
+
+    def test_answers_taught_in_one_worker_reach_the_other(self):
+        first, second = self.workers
+        first.teach("hire", "Weekly")
+        second.teach("scaffolding", "Towers")
+        first.teach("contact", "Email us")
+
+        for worker in self.workers:
+            self.assertEqual(worker.ask("hire")["answer"], "Weekly")
+            self.assertEqual(worker.ask("scaffolding")["answer"], "Towers")
+        # Both workers hold the entries in the journal's order
+        self.assertEqual(first.current()[0].questions(), second.current()[0].questions())
+
+    @patch('src.chatbot.JOURNAL_COMPACT_EVERY', 3)
+    def test_compacting_worker_keeps_its_entries(self):
+        first, second = self.workers
+        for number in range(3):
+            first.teach(f"hire {number}", "Weekly")
+        # The third answer compacted the journal into the JSON file, which the other worker
+        # picks up when its watcher reloads it
+        self.assertEqual(len(first.current()[0]), 4)
+        second.reload()
+        self.assertEqual(first.current()[0].questions(), second.current()[0].questions())
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), "pre-forking needs os.fork")
+class TestPrefork(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, 'knowledge_base.json'), 'w') as file:
+            json.dump({"questions": [{"question": "contact details", "answer": "Ring us"}]}, file)
+
+        script = (
+            "import os, sys\n"
+            "from unittest.mock import patch\n"
+            "from test.helpers import make_nlp\n"
+            "import src.chatbot, src.server\n"
+            "os.chdir(sys.argv[1])\n"
+            "with patch('src.chatbot._embedder', make_nlp()):\n"
+            "    src.server.serve('knowledge_base.json', '127.0.0.1', 0, threads=2, workers=int(sys.argv[2]))\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.process = subprocess.Popen([sys.executable, '-c', script, directory, '4'], cwd=root,
+                                        stdout=subprocess.PIPE, text=True)
+        self.url = self.process.stdout.readline().split()[-1]
+
+    def tearDown(self):
+        self.process.send_signal(signal.SIGTERM)
+        self.assertEqual(self.process.wait(timeout=30), 0)
+        self.process.stdout.close()
+
+    def post(self, path, payload):
+        request = urllib.request.Request(f"{self.url}{path}", data=json.dumps(payload).encode())
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    def test_workers_serve_and_stop(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            answers = list(executor.map(lambda question: self.post('/ask', {"question": question})["answer"],
+                                        ["contact"] * 20))
+        self.assertEqual(answers, ["Ring us"] * 20)
+
+    def test_chat_sessions_span_workers(self):
+        # Each message may be accepted by any of the workers, so the pending question has to reach them all
+        for number in range(20):
+            body = self.post('/chat', {"message": f"unknown question {number}"})
+            self.assertEqual(body["kind"], 'teach_prompt')
+            body = self.post('/chat', {"message": f"answer {number}", "session_id": body["session_id"]})
+            self.assertEqual(body["kind"], 'learned')
+
+if __name__ == '__main__':
+    unittest.main()
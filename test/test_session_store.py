@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.session_store import SESSION_HISTORY, SessionStore, SharedSessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_unknown_ids_get_a_new_session(self):
+        store = SessionStore(ttl=60, capacity=10, clock=self.clock)
+        session_id, session = store.get()
+        self.assertEqual(store.get(session_id), (session_id, session))
+
+        other_id, other = store.get("made-up")
+        self.assertNotEqual(other_id, "made-up")
+        self.assertIsNot(other, session)
+        self.assertEqual(len(store), 2)
+
+    def test_idle_sessions_expire(self):
+        store = SessionStore(ttl=60, capacity=10, clock=self.clock)
+        idle_id, _ = store.get()
+        active_id, active = store.get()
+        self.clock.now += 40
+        store.get(active_id)
+        self.clock.now += 30
+
+        self.assertEqual(store.get(active_id)[1], active)
+        self.assertNotEqual(store.get(idle_id)[0], idle_id)
+        self.assertEqual(len(store), 2)
+
+    def test_least_recently_used_is_evicted_above_capacity(self):
+        store = SessionStore(ttl=60, capacity=2, clock=self.clock)
+        first_id, _ = store.get()
+        second_id, _ = store.get()
+        store.get(first_id)
+        store.get()
+
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.get(first_id)[0], first_id)
+        self.assertNotEqual(store.get(second_id)[0], second_id)
+
+    def test_history_is_bounded(self):
+        _, session = SessionStore(clock=self.clock).get()
+        for number in range(SESSION_HISTORY + 3):
+            session.remember(f"question {number}", f"answer {number}")
+        self.assertEqual(len(session.history), SESSION_HISTORY)
+        self.assertEqual(session.history[-1], (f"question {SESSION_HISTORY + 2}", f"answer {SESSION_HISTORY + 2}"))
+
+    def test_sessions_survive_a_restart(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'sessions.json')
+
+        store = SessionStore(ttl=60, capacity=10, path=path, clock=self.clock)
+        session_id, session = store.get()
+        session.pending_question = "opening hours"
+        session.remember("opening hours", "Sorry")
+        store.close()
+
+        restored_id, restored = SessionStore(ttl=60, capacity=10, path=path, clock=self.clock).get(session_id)
+        self.assertEqual(restored_id, session_id)
+        self.assertEqual(restored.pending_question, "opening hours")
+        self.assertEqual(list(restored.history), [("opening hours", "Sorry")])
+
+        # Sessions that expired while the server was down are not restored
+        self.clock.now += 120
+        self.assertEqual(len(SessionStore(ttl=60, capacity=10, path=path, clock=self.clock)), 0)
+
+
+class TestSharedSessionStore(unittest.TestCase):
+    """Two stores over one knowledge base stand in for two pre-forked workers."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.knowledge_base_file = os.path.join(directory, 'knowledge_base.json')
+
+    def make_store(self, capacity=10):
+        return SharedSessionStore(self.knowledge_base_file, ttl=60, capacity=capacity, clock=self.clock,
+                                  sweep_interval=0)
+
+    def test_a_session_continues_in_another_store(self):
+        first, second = self.make_store(), self.make_store()
+        session_id, session = first.get()
+        session.pending_question = "opening hours"
+        session.remember("opening hours", "Sorry")
+        first.put(session_id, session)
+
+        restored_id, restored = second.get(session_id)
+        self.assertEqual(restored_id, session_id)
+        self.assertEqual(restored.pending_question, "opening hours")
+        self.assertEqual(list(restored.history), [("opening hours", "Sorry")])
+
+        second.discard(session_id)
+        self.assertNotEqual(first.get(session_id)[0], session_id)
+        self.assertNotEqual(first.get("../knowledge_base")[0], "../knowledge_base")
+
+    def test_idle_and_least_recent_sessions_are_swept(self):
+        store = self.make_store(capacity=2)
+        ids = []
+        for _ in range(3):
+            session_id, session = store.get()
+            store.put(session_id, session)
+            ids.append(session_id)
+            self.clock.now += 1
+        store.get()
+        self.assertEqual(len(store), 2)
+        self.assertNotEqual(store.get(ids[0])[0], ids[0])
+
+        self.clock.now += 60
+        self.assertNotEqual(store.get(ids[2])[0], ids[2])
+        self.assertEqual(len(store), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+import src.chatbot as chatbot
+from src.ann_index import IVFIndex
+from src.knowledge_base import KnowledgeBase
+from src.question_index import QuestionIndex
+from src.snapshot import read_snapshot, snapshot_path, source_stamp, write_snapshot
+from test.helpers import make_nlp
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.knowledge_base_file = os.path.join(self.directory, 'knowledge_base.json')
+        self.data = {
+            "version": 3,
+            "questions": [
+                {"question": "contact details", "answer": "Ring us é"},
+                {"question": "scaffolding hire", "answer": None, "tags": ["hire"]},
+                {"question": "contact details", "answer": "Duplicate entry"},
+            ]
+        }
+        with open(self.knowledge_base_file, 'w') as file:
+            json.dump(self.data, file)
+        self.nlp = make_nlp()
+        self.knowledge_base = KnowledgeBase(self.data)
+        self.question_index = QuestionIndex.build(self.knowledge_base.row_questions(), self.nlp)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, model="test-model"):
+        return write_snapshot(self.knowledge_base_file, self.knowledge_base, self.question_index, model,
+                              source_stamp(self.knowledge_base_file))
+
+    def test_round_trip(self):
+        self.assertTrue(self.write())
+        knowledge_base, question_index = read_snapshot(self.knowledge_base_file, "test-model")
+
+        self.assertEqual(knowledge_base.to_dict(), self.data)
+        self.assertEqual(knowledge_base.find("contact details"), 0)
+        self.assertEqual(knowledge_base.find("scaffolding hire"), 1)
+        self.assertIsNone(knowledge_base.find("unknown"))
+        self.assertEqual(knowledge_base.row(2), 0)
+        np.testing.assert_array_equal(question_index.matrix, self.question_index.matrix)
+
+    def test_mapped_knowledge_base_accepts_new_entries(self):
+        self.write()
+        knowledge_base, question_index = read_snapshot(self.knowledge_base_file, "test-model")
+        position = knowledge_base.add("hire", "Weekly")
+        question_index.add("hire", self.nlp)
+
+        self.assertEqual(knowledge_base.find("hire"), position)
+        self.assertEqual(knowledge_base.answer(position), "Weekly")
+        self.assertEqual(len(question_index), knowledge_base.row_count())
+        self.assertEqual([knowledge_base.row(position) for position in range(len(knowledge_base))], [0, 1, 0, 2])
+
+    def test_integer_columns_stay_mapped_until_an_entry_is_added(self):
+        self.write()
+        knowledge_base, _ = read_snapshot(self.knowledge_base_file, "test-model")
+        rows = knowledge_base.columns()["rows"]
+        self.assertIsInstance(rows._values, np.ndarray)
+        self.assertFalse(rows._values.flags.writeable)
+
+        knowledge_base.add("hire", "Weekly")
+        self.assertNotIsInstance(rows._values, np.ndarray)
+        # A knowledge base read from a snapshot can be compiled again
+        self.assertTrue(write_snapshot(self.knowledge_base_file, knowledge_base,
+                                       QuestionIndex.build(knowledge_base.row_questions(), self.nlp), "test-model",
+                                       source_stamp(self.knowledge_base_file)))
+        reread, _ = read_snapshot(self.knowledge_base_file, "test-model")
+        self.assertEqual(reread.find("hire"), 3)
+
+    def test_shared_rebuild_runs_once_and_is_mapped(self):
+        # Stands in for two workers noticing the same change to the file
+        with patch('src.chatbot._embedder', self.nlp), \
+                patch('src.chatbot.build_question_index', wraps=chatbot.build_question_index) as build:
+            loaded = [chatbot.load_knowledge_base_snapshot(self.knowledge_base_file, shared=True) for _ in range(2)]
+
+        self.assertEqual(build.call_count, 1)
+        for knowledge_base, question_index in loaded:
+            self.assertEqual(len(knowledge_base), 3)
+            # Read-only pages of the mapped snapshot, not a private matrix
+            self.assertFalse(question_index.matrix.flags.writeable)
+
+    def test_stale_when_source_or_model_changes(self):
+        self.write()
+        self.assertIsNone(read_snapshot(self.knowledge_base_file, "other-model"))
+        with open(self.knowledge_base_file, 'a') as file:
+            file.write('\n')
+        self.assertIsNone(read_snapshot(self.knowledge_base_file, "test-model"))
+
+    def test_ann_lists_are_kept(self):
+        self.question_index.ann = IVFIndex.train(self.question_index.matrix, n_lists=2)
+        self.write()
+        _, question_index = read_snapshot(self.knowledge_base_file, "test-model")
+        self.assertEqual([list(rows) for rows in question_index.ann.lists],
+                         [list(rows) for rows in self.question_index.ann.lists])
+
+    def test_unreadable_snapshot_is_ignored(self):
+        with open(snapshot_path(self.knowledge_base_file), 'wb') as file:
+            file.write(b'not a snapshot')
+        with self.assertLogs(level='WARNING'):
+            self.assertIsNone(read_snapshot(self.knowledge_base_file, "test-model"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import multiprocessing
+import unittest
+
+import numpy as np
+import spacy
+
+from src.token_vectors import TokenVectorCache
+from test.helpers import make_nlp
+
+
+class TestTokenVectorCache(unittest.TestCase):
+    def setUp(self):
+        self.nlp = make_nlp()
+        self.cache = TokenVectorCache(self.nlp, capacity=3)
+
+    def test_bit_identical_to_doc_vector(self):
+        texts = ["contact details", "scaffolding  hire please", "unknown", "", "hire hire contact details?"]
+        for text in texts * 2:
+            doc = self.nlp(text)
+            fast = self.cache(text)
+            self.assertTrue(np.array_equal(doc.vector, fast.vector), text)
+            self.assertEqual(doc.vector.dtype, fast.vector.dtype)
+            self.assertEqual(doc.vector_norm, fast.vector_norm, text)
+
+    def test_pipe_matches_call(self):
+        texts = ["contact details", "scaffolding hire"]
+        for text, fast in zip(texts, self.cache.pipe(texts)):
+            self.assertTrue(np.array_equal(fast.vector, self.cache(text).vector))
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), "pool processes are forked")
+    def test_pipe_across_processes_keeps_order_and_values(self):
+        texts = ["contact details", "scaffolding hire", "unknown", "", "hire contact"] * 3
+        pooled = list(self.cache.pipe(texts, batch_size=4, n_process=2))
+        self.assertEqual(len(pooled), len(texts))
+        for text, fast in zip(texts, pooled):
+            single = self.cache(text)
+            self.assertTrue(np.array_equal(fast.vector, single.vector), text)
+            self.assertEqual(fast.vector_norm, single.vector_norm, text)
+
+    def test_unknown_tokens_share_one_zero_vector(self):
+        first, second, known = self.cache.token_vectors([self.nlp.vocab.strings.add(word)
+                                                          for word in ("typo", "tpyo", "hire")])
+        self.assertIs(first, second)
+        self.assertFalse(first.any() or first.flags.writeable)
+        self.assertTrue(np.array_equal(known, self.nlp.vocab.get_vector("hire")))
+
+    def test_cache_is_bounded(self):
+        self.cache("contact details scaffolding hire unknown")
+        self.assertLessEqual(len(self.cache), 3)
+
+    def test_only_supports_vectors_only_pipelines(self):
+        self.assertTrue(TokenVectorCache.supports(self.nlp))
+        with_component = make_nlp()
+        with_component.add_pipe("sentencizer")
+        self.assertFalse(TokenVectorCache.supports(with_component))
+        self.assertFalse(TokenVectorCache.supports(spacy.blank("en")))
+
+
+if __name__ == '__main__':
+    unittest.main()